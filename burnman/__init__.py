@@ -36,3 +36,6 @@ from partitioning import calculate_partition_coefficient,calculate_phase_percent
 import minerals
 import seismic
 import averaging_schemes
+import evaluation
+from evaluation import evaluate
+import misfit
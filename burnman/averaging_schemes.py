@@ -11,7 +11,14 @@ class averaging_scheme:
     New averaging schemes should define the functions
     average_bulk_moduli and average_shear_moduli, as
     specified here.
+
+    If a scheme sets vectorized = True, its functions also accept
+    arrays of shape (n_phases, n_evaluation_points) and return one
+    value per evaluation point, so that whole profiles can be
+    averaged in one call (see :class:`burnman.phase_properties`).
     """
+    vectorized = False
+
     def average_bulk_moduli(self, volumes, bulk_moduli, shear_moduli):
         """
         Average the bulk moduli of an assemblage, given
@@ -34,8 +41,8 @@ class averaging_scheme:
         not be controvsersial... :)
         Returns: a single density
         """
-        total_mass = np.sum(np.array(densities)*np.array(volumes))
-        total_vol = np.sum(np.array(volumes)) #should sum to one
+        total_mass = np.sum(np.array(densities)*np.array(volumes), axis=0)
+        total_vol = np.sum(np.array(volumes), axis=0) #should sum to one
         density = total_mass/total_vol
         return density
          
@@ -51,6 +58,7 @@ class voigt_reuss_hill(averaging_scheme):
     Returns: mixture of property X
     
     Source: Matas 2007, Appendix D """
+    vectorized = True
     
     def average_bulk_moduli(self, volumes, bulk_moduli, shear_moduli):
         return voigt_reuss_hill_function(volumes, bulk_moduli)
@@ -61,6 +69,8 @@ class voigt_reuss_hill(averaging_scheme):
 
 class voigt(averaging_scheme):
     """ Compute Voigt (iso-strain) bound. """
+    vectorized = True
+
     def average_bulk_moduli(self, volumes, bulk_moduli, shear_moduli):
         return voigt_average_function(volumes, bulk_moduli)
 
@@ -70,6 +80,8 @@ class voigt(averaging_scheme):
 
 class reuss(averaging_scheme):
     """ Compute Reuss (iso-stress) bound."""
+    vectorized = True
+
     def average_bulk_moduli(self, volumes, bulk_moduli, shear_moduli):
         return reuss_average_function(volumes, bulk_moduli)
 
@@ -82,34 +94,36 @@ class hashin_shtrikman_upper(averaging_scheme):
     Lower of the two Hashin-Shtrikman bounds.  
     Implements Formulas from Watt et al (1976)
     """
+    vectorized = True
+
     def average_bulk_moduli(self, volumes, bulk_moduli, shear_moduli):
 
-      K_n = max(bulk_moduli)
-      G_n = max(shear_moduli)
+      bulk_moduli = np.asarray(bulk_moduli, dtype=float)
+      K_n = np.max(bulk_moduli, axis=0)
+      G_n = np.max(shear_moduli, axis=0)
 
-      vol_frac = volumes/sum(volumes)
+      vol_frac = np.asarray(volumes, dtype=float)/np.sum(volumes, axis=0)
  
       alpha_n = -3. / (3.*K_n+4.*G_n)
       A_n = 0
       for i in range(len(vol_frac)):
-          if  bulk_moduli[i] != K_n:
-              A_n = A_n + vol_frac[i]/(1./(bulk_moduli[i] - K_n) - alpha_n)
+          A_n = A_n + _hs_term(vol_frac[i], bulk_moduli[i] - K_n, alpha_n)
 
       K_upper = K_n + A_n/(1. + alpha_n*A_n)
       return K_upper
 
     def average_shear_moduli(self, volumes, bulk_moduli, shear_moduli):
 
-      K_n = max(bulk_moduli)
-      G_n = max(shear_moduli)
+      shear_moduli = np.asarray(shear_moduli, dtype=float)
+      K_n = np.max(bulk_moduli, axis=0)
+      G_n = np.max(shear_moduli, axis=0)
 
-      vol_frac = volumes/sum(volumes)
+      vol_frac = np.asarray(volumes, dtype=float)/np.sum(volumes, axis=0)
  
       beta_n = -3. * (K_n + 2.*G_n)  / (5.*G_n * (3.*K_n+4.*G_n))
       B_n = 0
       for i in range(len(vol_frac)):
-          if  shear_moduli[i] != G_n:
-              B_n = B_n + vol_frac[i]/(1./(2.*(shear_moduli[i] - G_n)) - beta_n)
+          B_n = B_n + _hs_term(vol_frac[i], 2.*(shear_moduli[i] - G_n), beta_n)
 
       G_upper = G_n + (0.5)*B_n/(1. + beta_n*B_n)
       return G_upper
@@ -119,34 +133,36 @@ class hashin_shtrikman_lower(averaging_scheme):
     Lower of the two Hashin-Shtrikman bounds.  
     Implements Formulas from Watt et al (1976)
     """
+    vectorized = True
+
     def average_bulk_moduli(self, volumes, bulk_moduli, shear_moduli):
 
-      K_1 = min(bulk_moduli)
-      G_1 = min(shear_moduli)
+      bulk_moduli = np.asarray(bulk_moduli, dtype=float)
+      K_1 = np.min(bulk_moduli, axis=0)
+      G_1 = np.min(shear_moduli, axis=0)
 
-      vol_frac = volumes/sum(volumes)
+      vol_frac = np.asarray(volumes, dtype=float)/np.sum(volumes, axis=0)
  
       alpha_1 = -3. / (3.*K_1+4.*G_1)
       A_1 = 0
       for i in range(len(vol_frac)):
-          if  bulk_moduli[i] != K_1:
-              A_1 = A_1 + vol_frac[i]/(1./(bulk_moduli[i] - K_1) - alpha_1)
+          A_1 = A_1 + _hs_term(vol_frac[i], bulk_moduli[i] - K_1, alpha_1)
 
       K_lower = K_1 + A_1/(1. + alpha_1*A_1)
       return K_lower
 
     def average_shear_moduli(self, volumes, bulk_moduli, shear_moduli):
 
-      K_1 = min(bulk_moduli)
-      G_1 = min(shear_moduli)
+      shear_moduli = np.asarray(shear_moduli, dtype=float)
+      K_1 = np.min(bulk_moduli, axis=0)
+      G_1 = np.min(shear_moduli, axis=0)
 
-      vol_frac = volumes/sum(volumes)
+      vol_frac = np.asarray(volumes, dtype=float)/np.sum(volumes, axis=0)
  
       beta_1 = -3. * (K_1 + 2.*G_1)  / (5.*G_1 * (3.*K_1+4.*G_1))
       B_1 = 0
       for i in range(len(vol_frac)):
-          if  shear_moduli[i] != G_1:
-              B_1 = B_1 + vol_frac[i]/(1./(2.*(shear_moduli[i] - G_1)) - beta_1)
+          B_1 = B_1 + _hs_term(vol_frac[i], 2.*(shear_moduli[i] - G_1), beta_1)
 
       G_lower = G_1 + (0.5)*B_1/(1. + beta_1*B_1)
       return G_lower
@@ -156,6 +172,8 @@ class hashin_shtrikman_average(averaging_scheme):
     Arithmetic mean of the upper and lower
     Hashin-Shtrikman bounds
     """
+    vectorized = True
+
     def __init__(self):
         self.upper = hashin_shtrikman_upper()
         self.lower = hashin_shtrikman_lower()
@@ -170,12 +188,25 @@ class hashin_shtrikman_average(averaging_scheme):
         
       
 
+def _hs_term(vol_frac, modulus_difference, factor):
+    """
+    Contribution of one phase to the sums in the Hashin-Shtrikman
+    bounds, vol_frac/(1/modulus_difference - factor). Phases with the
+    same modulus as the extremal one (modulus_difference zero) do not
+    contribute.
+    """
+    same = (modulus_difference == 0.)
+    with np.errstate(divide='ignore'):
+        term = vol_frac/(1./np.where(same, 1., modulus_difference) - factor)
+    return np.where(same, 0., term)
+
 def voigt_average_function(phase_volume,X):
     """
     Do Voigt (iso-strain) average.  Rather like
     resistors in series.  Called by voigt and
     voigt_reuss_hill classes, takes a list of
     volumes and moduli, returns a modulus.
+    The lists can also be arrays of shape (n_phases, n_points).
     """
     it = range(len(phase_volume))
     V_i = phase_volume
@@ -189,10 +220,21 @@ def reuss_average_function(phase_volume,X):
     resistors in parallel.  Called by reuss and
     voigt_reuss_hill classes, takes a list of
     volumes and moduli, returns a modulus.
+    The lists can also be arrays of shape (n_phases, n_points).
     """
     it = range(len(phase_volume))
     V_i = phase_volume
     V_tot = sum(V_i)
+    if np.ndim(X) > 1:
+        X = np.asarray(X, dtype=float)
+        # moduli that are nan (no shear modulus) give nan, like for lists
+        with np.errstate(invalid='ignore'):
+            invalid = np.min(X, axis=0) <= 0.0
+        if np.any(invalid):
+            warnings.warn("Oops, called reuss_average with Xi<=0!")
+        X_safe = np.where(invalid, 1., X)
+        X_reuss = 1./sum(  V_i[i]/V_tot* 1./X_safe[i] for i in it)
+        return np.where(invalid, 0.0, X_reuss)
     if (min(X)<=0.0):
         X_reuss = 0.0
         warnings.warn("Oops, called reuss_average with Xi<=0!")
@@ -4,7 +4,9 @@
 
 import numpy as np
 import warnings
+import copy
 from collections import namedtuple
+import evaluation
 
 class abstract_material:
     """
@@ -35,6 +37,16 @@ class abstract_material:
         raise NotImplementedError("need to implement this in derived class!")
         return ()
 
+    def static_unroll(self):
+        """ return (fractions, minerals) like unroll() if they do not depend on the current state, otherwise None """
+        return None
+
+    def unroll_at(self, pressure, temperature):
+        """ return (fractions, minerals) like unroll() at the given state, without changing the state of this material """
+        material = copy.copy(self)
+        material.set_state(pressure, temperature)
+        return material.unroll()
+
     def density(self):
         raise NotImplementedError("need to implement this in derived class!")
         return inf            
@@ -90,6 +102,8 @@ class composite(composite_base):
             warnings.warn('Warning: list of molar fractions does not add up to one. Normalizing')
         for ph in phase_tuples:
             self.staticphases.append( phase(ph[0], ph[1]/total) )
+        # results for the last profile this composite was evaluated at
+        self.profile_cache = evaluation.profile_cache()
 
     def set_method(self, method):
         """
@@ -109,6 +123,31 @@ class composite(composite_base):
             minerals.extend(p_min)
         return (fractions, minerals)
 
+    def static_unroll(self):
+        fractions = []
+        minerals = []
+
+        for p in self.staticphases:
+            unrolled = p.mineral.static_unroll()
+            if unrolled is None:
+                return None
+            p_fr,p_min = unrolled
+            check_pairs(p_fr, p_min)
+            fractions.extend([i*p.fraction for i in p_fr])
+            minerals.extend(p_min)
+        return (fractions, minerals)
+
+    def unroll_at(self, pressure, temperature):
+        fractions = []
+        minerals = []
+
+        for p in self.staticphases:
+            p_fr,p_min = p.mineral.unroll_at(pressure, temperature)
+            check_pairs(p_fr, p_min)
+            fractions.extend([i*p.fraction for i in p_fr])
+            minerals.extend(p_min)
+        return (fractions, minerals)
+
     def to_string(self):
         """
         return the name of the composite
@@ -4,7 +4,6 @@
 
 import numpy as np
 import scipy.integrate as integrate
-import matplotlib.pyplot as plt
 import time
 
 """
@@ -21,7 +20,11 @@ def debye_fn(x):
     """
     Evaluate the Debye function.  Takes the parameter
     xi = Debye_T/T
+    Arrays of x are evaluated with debye_fn_cheb(), which agrees with the
+    quadrature to near machine-precision.
     """
+    if not np.isscalar(x):
+        return debye_fn_cheb(x)
     sol = integrate.quad( lambda xi: pow(xi,3.)/(np.exp(xi)-1.) , 0.0, x) # EQ B3
     return 3.*sol[0]/pow(x,3.)
 
@@ -43,7 +46,11 @@ def debye_fn_cheb(x):
     asymptotic solutions of the function.  Shamelessly adapted from the GSL implementation
     of the same function (Itself adapted from Collected Algorithms from ACM).  
     Should give the same result as debye_fn(x) to near machine-precision.
+    x can also be an array, in which case all entries are evaluated at once.
     """
+    if not np.isscalar(x):
+        return _debye_fn_cheb_array(np.asarray(x, dtype=float))
+
     val_infinity = 19.4818182068004875;
     xcut = -log_eps
 
@@ -75,13 +82,69 @@ def debye_fn_cheb(x):
     else:
         return ((val_infinity/x)/x)/x;
 
+def _debye_fn_cheb_array(x):
+    """
+    Array version of debye_fn_cheb(). Every branch of the scalar function is
+    applied to the entries that fall into it, using the same arithmetic so that
+    the results agree with the scalar function exactly.
+    """
+    val_infinity = 19.4818182068004875;
+    xcut = -log_eps
+
+    assert(np.all(x > 0.0)) #check for invalid x
+
+    result = np.empty_like(x)
+
+    small = x < 2.0*np.sqrt(2.0)*sqrt_eps
+    xs = x[small]
+    result[small] = 1.0 - 3.0*xs/8.0 + xs*xs/20.0
+
+    cheb = ~small & (x <= 4.0)
+    xs = x[cheb]
+    result[cheb] = chebyshev_representation(xs*xs/8.0 - 1.0) - 0.375*xs
+
+    series = (x > 4.0) & (x < -(np.log(2.0) + log_eps ))
+    xs = x[series]
+    if xs.size > 0:
+        nexp = np.floor(xcut/xs)
+        ex = np.exp(-xs)
+        xk = nexp * xs
+        rk = nexp.copy()
+        sum = np.zeros_like(xs)
+        # run the scalar recursion for all entries at once, every entry only
+        # takes part in its own nexp iterations
+        for i in range(int(np.max(nexp)),0,-1):
+            active = nexp >= i
+            xk_inv = 1.0/xk[active]
+            sum[active] *= ex[active]
+            sum[active] += (((6.0*xk_inv + 6.0)*xk_inv + 3.0)*xk_inv + 1.0) / rk[active]
+            rk[active] -= 1.0
+            xk[active] -= xs[active]
+        result[series] = val_infinity/(xs*xs*xs) - 3.0 * sum * ex
+
+    asymptotic = (x >= -(np.log(2.0) + log_eps )) & (x < xcut)
+    xs = x[asymptotic]
+    x3 = xs*xs*xs
+    result[asymptotic] = (val_infinity - 3.0 * (6.0 + 6.0*xs + 3.0*xs*xs + x3) * np.exp(-xs)) / x3
+
+    large = x >= xcut
+    xs = x[large]
+    result[large] = ((val_infinity/xs)/xs)/xs
+
+    return result
+
 
 def thermal_energy(T, debye_T, n):
     """
     calculate the thermal energy of a substance.  Takes the temperature,
     the Debye temperature, and n, the number of atoms per molecule.
-    Returns thermal energy in J/mol
+    Returns thermal energy in J/mol. The arguments can also be arrays, which
+    are broadcast against each other.
     """
+    if not (np.isscalar(T) and np.isscalar(debye_T)):
+        T = np.asarray(T, dtype=float)
+        T_safe = np.where(T == 0, 1., T)
+        return np.where(T == 0, 0., 3.*n*R*T * debye_fn_cheb(debye_T/T_safe))
     if T == 0:
         return 0
     E_th = 3.*n*R*T * debye_fn_cheb(debye_T/T)
@@ -89,19 +152,42 @@ def thermal_energy(T, debye_T, n):
 
 def heat_capacity_v(T,debye_T,n):
     """
-    Heat capacity at constant volume.  In J/K/mol
+    Heat capacity at constant volume.  In J/K/mol. The arguments can also be
+    arrays, which are broadcast against each other.
     """
+    if not (np.isscalar(T) and np.isscalar(debye_T)):
+        T = np.asarray(T, dtype=float)
+        x = debye_T/np.where(T == 0, 1., T)
+        C_v = 3.0*n*R* ( 4.0*debye_fn_cheb(x) - 3.0*x/(np.exp(x)-1.0) )
+        return np.where(T == 0, 0., C_v)
     if T ==0:
         return 0
     x = debye_T/T
     C_v = 3.0*n*R* ( 4.0*debye_fn_cheb(x) - 3.0*x/(np.exp(x)-1.0) )
     return C_v
 
+def entropy(T, debye_T, n):
+    """
+    Vibrational entropy in J/K/mol, the temperature derivative of the
+    Helmholtz free energy of the Debye model. The arguments can also be
+    arrays, which are broadcast against each other.
+    """
+    if not (np.isscalar(T) and np.isscalar(debye_T)):
+        T = np.asarray(T, dtype=float)
+        x = debye_T/np.where(T == 0, 1., T)
+        S = n*R* ( 4.0*debye_fn_cheb(x) - 3.0*np.log1p(-np.exp(-x)) )
+        return np.where(T == 0, 0., S)
+    if T == 0:
+        return 0
+    x = debye_T/T
+    S = n*R* ( 4.0*debye_fn_cheb(x) - 3.0*np.log1p(-np.exp(-x)) )
+    return S
 
 
 
-if __name__ == "__main__":
 
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
 
     def old_thermal(T, debye_T, n):
         if T == 0:
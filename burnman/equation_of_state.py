@@ -2,6 +2,8 @@
 # Copyright (C) 2012, 2013, Heister, T., Unterborn, C., Rose, I. and Cottaar, S.
 # Released under GPL v2 or later.
 
+import numpy as np
+
 class equation_of_state:
     """
     This class defines the interface for an equation of state
@@ -17,14 +19,76 @@ class equation_of_state:
     such as reference volume, debye temperature, etc...
     The exceptions are volume and density, which are
     just assumed to be functions of pressure and temperature
+
+    Implementing pressure() allows minerals using this equation of state to
+    be evaluated for many states at once, see vectorized_volume(). For this,
+    all functions should only use numpy operations on their arguments, which
+    can then be arrays (including the entries of params).
     """
 
+    # interval [V/V_0] in which vectorized_volume() looks for the volume
+    volume_bracket = (0.5, 1.5)
+
     def volume(self, pressure, temperature, params):
         """
         Returns molar volume at the pressure and temperature [m^3]
         """
         raise NotImplementedError("")
 
+    def pressure(self, temperature, volume, params):
+        """
+        Returns pressure [Pa] as a function of temperature [K] and volume [m^3]
+        """
+        raise NotImplementedError("")
+
+    def vectorized_volume(self, pressure, temperature, params):
+        """
+        Returns molar volumes [m^3] for arrays of pressures [Pa] and
+        temperatures [K]. The entries of params can be arrays as well, so
+        that several minerals sharing this equation of state are solved
+        together; all arguments are broadcast against each other.
+
+        This is a Newton iteration on pressure() using the isothermal bulk
+        modulus as derivative, safeguarded by bisection inside
+        volume_bracket. Entries without a root in the bracket are handed to
+        volume() one at a time, so they warn or fail exactly as before.
+        """
+        V_0 = params['V_0']
+        lower = self.volume_bracket[0] * V_0
+        upper = self.volume_bracket[1] * V_0
+        residual_lower = self.pressure(temperature, lower, params) - pressure
+        residual_upper = self.pressure(temperature, upper, params) - pressure
+        shape = np.broadcast(residual_lower, residual_upper).shape
+        lower = lower * np.ones(shape)
+        upper = upper * np.ones(shape)
+
+        bracketed = residual_lower * residual_upper < 0.
+        V = np.where(bracketed, V_0 * np.ones(shape), 0.5*(lower+upper))
+
+        for i in range(100):
+            residual = self.pressure(temperature, V, params) - pressure
+            # pressure decreases with volume, so a positive residual means
+            # that the volume has to increase
+            lower = np.where(residual > 0., V, lower)
+            upper = np.where(residual > 0., upper, V)
+            K_T = self.isothermal_bulk_modulus(pressure, temperature, V, params)
+            V_new = V + residual*V/K_T
+            outside = ~((V_new >= lower) & (V_new <= upper))
+            V_new = np.where(outside, 0.5*(lower+upper), V_new)
+            converged = np.all((np.abs(V_new - V) <= 1.e-12*V) | ~bracketed)
+            V = V_new
+            if converged:
+                break
+
+        if not np.all(bracketed):
+            full_params = dict((key, np.broadcast_to(value, shape)) for (key, value) in params.items())
+            full_pressure = np.broadcast_to(pressure, shape)
+            full_temperature = np.broadcast_to(temperature, shape)
+            for idx in zip(*np.nonzero(~bracketed)):
+                single_params = dict((key, value[idx]) for (key, value) in full_params.items())
+                V[idx] = self.volume(full_pressure[idx], full_temperature[idx], single_params)
+        return V
+
     def density(self, pressure, temperature, params):
         """
         Returns density at the pressure and temperature [kg/m^3]
@@ -73,3 +137,9 @@ class equation_of_state:
         """
         raise NotImplementedError("")
 
+    def entropy(self, pressure, temperature, volume, params):
+        """
+        Returns the vibrational entropy at the pressure, temperature, and volume [J/K/mol]
+        """
+        raise NotImplementedError("")
+
@@ -0,0 +1,535 @@
+# BurnMan - a lower mantle toolkit
+# Copyright (C) 2012, 2013, Heister, T., Unterborn, C., Rose, I. and Cottaar, S.
+# Released under GPL v2 or later.
+
+"""
+Evaluation of the thermoelastic properties of many minerals at many
+pressures and temperatures at once. Minerals whose parameters do not depend
+on the state (see :func:`burnman.material.static_params`) are grouped by
+their equation of state, their parameters are stacked into arrays, and each
+group is solved in a single vectorized call over a (phases x points) batch.
+All other minerals are evaluated point by point.
+Identical minerals, for example the same end-member in several rocks that
+are compared with each other, are evaluated only once per state.
+
+:func:`evaluate` computes the properties of a rock without changing the
+state of the rock or of its minerals, so one rock definition can be
+evaluated from several threads at the same time.
+"""
+
+import numpy as np
+import warnings
+import threading
+from collections import OrderedDict
+
+import averaging_schemes
+
+# properties computed for every mineral, named like the attributes set in
+# burnman.material.set_state()
+property_names = ['V', 'gr', 'K_T', 'K_S', 'C_v', 'C_p', 'alpha', 'G', 'rho']
+
+
+def mineral_properties(method, params, pressures, temperatures):
+    """
+    Compute the thermoelastic properties for an equation of state.
+
+    :param burnman.equation_of_state method: equation of state to use
+
+    :type params: dictionary
+    :param params: material parameters, the entries can be arrays.
+
+    :type pressures: array of float
+    :param pressures: pressures in [Pa]
+
+    :type temperatures: array of float
+    :param temperatures: temperatures in [K]
+
+    :returns: dictionary with one array for each of property_names, all
+      arguments are broadcast against each other
+    :rtype: dictionary
+    """
+    V = method.vectorized_volume(pressures, temperatures, params)
+    props = {'V': V}
+    props['gr'] = method.grueneisen_parameter(pressures, temperatures, V, params)
+    props['K_T'] = method.isothermal_bulk_modulus(pressures, temperatures, V, params)
+    props['K_S'] = method.adiabatic_bulk_modulus(pressures, temperatures, V, params)
+    props['C_v'] = method.heat_capacity_v(pressures, temperatures, V, params)
+    props['C_p'] = method.heat_capacity_p(pressures, temperatures, V, params)
+    props['alpha'] = method.thermal_expansivity(pressures, temperatures, V, params)
+    if 'G_0' in params and 'Gprime_0' in params:
+        props['G'] = method.shear_modulus(pressures, temperatures, V, params)
+    else:
+        props['G'] = float('nan') #nan if there is no G, this should propagate through calculations to the end
+    if 'molar_mass' in params:
+        props['rho'] = params['molar_mass'] / V
+    else:
+        props['rho'] = float('nan') #density is only needed by materials that define a molar mass
+
+    for name in property_names:
+        props[name] = props[name] * np.ones(V.shape)
+    return props
+
+
+def state_properties(method, params, pressure, temperature):
+    """
+    Compute the thermoelastic properties for an equation of state at a single
+    pressure and temperature. This is what :func:`burnman.material.set_state`
+    stores in a mineral; neither the equation of state nor the parameters
+    are modified.
+
+    :param burnman.equation_of_state method: equation of state to use
+    :param dictionary params: material parameters
+    :param float pressure: pressure in [Pa]
+    :param float temperature: temperature in [K]
+
+    :returns: dictionary with a float for each of property_names
+    :rtype: dictionary
+    """
+    V = method.volume(pressure, temperature, params)
+    props = {'V': V}
+    props['gr'] = method.grueneisen_parameter(pressure, temperature, V, params)
+    props['K_T'] = method.isothermal_bulk_modulus(pressure, temperature, V, params)
+    props['K_S'] = method.adiabatic_bulk_modulus(pressure, temperature, V, params)
+    props['C_v'] = method.heat_capacity_v(pressure, temperature, V, params)
+    props['C_p'] = method.heat_capacity_p(pressure, temperature, V, params)
+    props['alpha'] = method.thermal_expansivity(pressure, temperature, V, params)
+    if 'G_0' in params and 'Gprime_0' in params:
+        props['G'] = method.shear_modulus(pressure, temperature, V, params)
+    else:
+        props['G'] = float('nan') #nan if there is no G, this should propagate through calculations to the end
+    if 'molar_mass' in params:
+        props['rho'] = params['molar_mass'] / V
+    else:
+        props['rho'] = float('nan') #density is only needed by materials that define a molar mass
+    return props
+
+
+def mineral_fingerprint(mineral):
+    """
+    Returns a hashable key that is the same for all minerals with identical
+    static parameters and equation of state, or None if the parameters of
+    the mineral depend on the state. Minerals with the same fingerprint are
+    only evaluated once by :func:`evaluate_phases`.
+    """
+    params = mineral.static_params()
+    if params is None:
+        return None
+    numeric = tuple(sorted((key, value) for (key, value) in params.items() \
+                               if isinstance(value, (int, long, float, np.number))))
+    return (mineral.method.__class__, getattr(mineral.method, 'order', None), numeric)
+
+
+def group_minerals(minerals, fingerprints=None):
+    """
+    Groups minerals with static parameters by their equation of state and
+    the names of their parameters, so that each group can be solved in one
+    vectorized call with :func:`evaluate_group`.
+
+    :type minerals: list of :class:`burnman.material`
+    :param minerals: minerals with static parameters
+
+    :type fingerprints: list
+    :param fingerprints: the :func:`mineral_fingerprint` of each mineral,
+                         computed if not given
+
+    :returns: for each group the equation of state, the parameters of its
+      minerals stacked into arrays of shape (n_minerals, 1), one row per
+      mineral, and the indices of its minerals in the list
+    :rtype: list of (equation_of_state, dictionary, list of int)
+    """
+    if fingerprints is None:
+        fingerprints = [mineral_fingerprint(mineral) for mineral in minerals]
+    groups = OrderedDict()
+    for (idx, (mineral, fingerprint)) in enumerate(zip(minerals, fingerprints)):
+        (method_class, order, numeric) = fingerprint
+        group = groups.setdefault((method_class, order, tuple(key for (key, value) in numeric)), (mineral.method, []))
+        group[1].append(idx)
+
+    result = []
+    for (method, indices) in groups.values():
+        numeric = [dict(fingerprints[idx][2]) for idx in indices]
+        params = dict((key, np.array([n[key] for n in numeric], dtype=float)[:, np.newaxis]) for key in numeric[0])
+        result.append((method, params, indices))
+    return result
+
+
+def evaluate_group(method, params, pressures, temperatures, volume_only=False):
+    """
+    Compute the properties of a group of minerals returned by
+    :func:`group_minerals` with :func:`mineral_properties`. If the equation
+    of state does not support vectorized evaluation, every mineral and
+    state is solved on its own with :func:`state_properties` instead.
+
+    :param burnman.equation_of_state method: equation of state of the group
+
+    :type params: dictionary
+    :param params: stacked parameters of the minerals of the group
+
+    :type pressures: array of float
+    :param pressures: pressures in [Pa], broadcast against the parameters
+
+    :type temperatures: array of float
+    :param temperatures: temperatures in [K], broadcast against the parameters
+
+    :param bool volume_only: only compute the volume 'V' and the density 'rho'
+
+    :returns: dictionary with one array for each property, of the shape of
+      all arguments broadcast against each other
+    :rtype: dictionary
+    """
+    names = ['V', 'rho'] if volume_only else property_names
+    try:
+        if volume_only:
+            V = method.vectorized_volume(pressures, temperatures, params)
+            return {'V': V, 'rho': params['molar_mass'] / V if 'molar_mass' in params else float('nan') * V}
+        return mineral_properties(method, params, pressures, temperatures)
+    except NotImplementedError:
+        # the equation of state does not support vectorized evaluation
+        shape = np.broadcast(pressures, temperatures, *params.values()).shape
+        pressures = np.broadcast_to(pressures, shape)
+        temperatures = np.broadcast_to(temperatures, shape)
+        params = dict((key, np.broadcast_to(value, shape)) for (key, value) in params.items())
+        props = dict((name, np.empty(shape)) for name in names)
+        for index in np.ndindex(*shape):
+            point = state_properties(method, dict((key, value[index]) for (key, value) in params.items()),
+                                     pressures[index], temperatures[index])
+            for name in names:
+                props[name][index] = point[name]
+        return props
+
+
+# Results of evaluate_phases() that are shared between all minerals with the
+# same fingerprint, also across different rocks. Maps (fingerprint, state) to
+# the dictionary of (read-only) property arrays. The least recently used
+# entries are dropped once more than shared_cache_size evaluation points are
+# stored.
+shared_cache_size = 1000000
+_shared_results = OrderedDict()
+_shared_points = [0]
+_shared_lock = threading.Lock()
+
+def clear_shared_results():
+    """
+    Forget all results shared between identical minerals.
+    """
+    with _shared_lock:
+        _shared_results.clear()
+        _shared_points[0] = 0
+
+def _shared_result(key):
+    with _shared_lock:
+        props = _shared_results.pop(key, None)
+        if props is not None:
+            _shared_results[key] = props # mark as recently used
+        return props
+
+def _share_result(key, props):
+    n_points = len(props['V'])
+    if n_points > shared_cache_size:
+        return
+    for name in property_names:
+        props[name].flags.writeable = False
+    with _shared_lock:
+        if key in _shared_results:
+            return
+        _shared_results[key] = props
+        _shared_points[0] += n_points
+        while _shared_points[0] > shared_cache_size:
+            (old_key, old_props) = _shared_results.popitem(last=False)
+            _shared_points[0] -= len(old_props['V'])
+
+
+class profile_cache:
+    """
+    Remembers the properties of the minerals of one rock for the profile of
+    pressures and temperatures it was last evaluated at. When the rock is
+    evaluated along the same profile again, only the minerals whose
+    parameters changed in the meantime (and therefore have a new
+    fingerprint) are solved, all others reuse their results. Every
+    :class:`burnman.composite` owns one, which is used by
+    :func:`burnman.velocities_from_rock` and :func:`burnman.calculate_moduli`.
+
+    :var list changed: the minerals that were not found in the cache during
+                       the last evaluation
+    """
+
+    def __init__(self):
+        self.state = None
+        self.results = {}
+        self.changed = []
+
+
+def evaluate_phases(minerals, pressures, temperatures, cache=None):
+    """
+    Compute the thermoelastic properties of a list of minerals at the given
+    pressures and temperatures. Minerals with static parameters that share an
+    equation of state are solved together, and identical minerals (see
+    :func:`mineral_fingerprint`) are only solved once per state, even across
+    calls for different rocks. Shared results are returned as read-only
+    arrays.
+
+    :type minerals: list of :class:`burnman.material`
+    :param minerals: minerals to evaluate, for example the second return
+                     value of unroll()
+
+    :type pressures: list of float
+    :param pressures: list of pressures you want to evaluate the minerals at. In [Pa].
+
+    :type temperatures: list of float
+    :param temperatures: list of temperatures you want to evaluate the minerals at. In [K].
+
+    :type cache: :class:`profile_cache`
+    :param cache: optional cache of the rock the minerals belong to, only
+                  minerals that changed since its last evaluation are solved.
+
+    :returns: for each mineral a dictionary with one array (of length
+      n_evaluation_points) for each of property_names
+    :rtype: list of dictionaries
+    """
+    pressures = np.asarray(pressures, dtype=float)
+    temperatures = np.asarray(temperatures, dtype=float)
+    state = (pressures.shape, pressures.tostring(), temperatures.tostring())
+    results = [None for m in minerals]
+    fingerprints = [mineral_fingerprint(mineral) for mineral in minerals]
+
+    known = {}
+    if cache is not None:
+        if cache.state == state:
+            known = cache.results
+        cache.changed = [mineral for (mineral, fingerprint) in zip(minerals, fingerprints) \
+                             if fingerprint is None or fingerprint not in known]
+
+    # indices of all minerals with the same fingerprint, each fingerprint is
+    # solved once
+    unique = OrderedDict()
+    for (idx, mineral) in enumerate(minerals):
+        fingerprint = fingerprints[idx]
+        if fingerprint is None:
+            results[idx] = evaluate_pointwise(mineral, pressures, temperatures)
+            continue
+        if fingerprint in known:
+            results[idx] = known[fingerprint]
+            continue
+        shared = _shared_result((fingerprint, state))
+        if shared is not None:
+            results[idx] = shared
+            continue
+        unique.setdefault(fingerprint, (mineral, []))[1].append(idx)
+
+    unique = unique.items()
+    for (method, params, rows) in group_minerals([mineral for (fingerprint, (mineral, indices)) in unique],
+                                                 [fingerprint for (fingerprint, value) in unique]):
+        props = evaluate_group(method, params, pressures[np.newaxis, :], temperatures[np.newaxis, :])
+        for (row, (fingerprint, (mineral, indices))) in enumerate([unique[u] for u in rows]):
+            if not ('G_0' in params and 'Gprime_0' in params):
+                warnings.warn(('Warning: G_0 and or Gprime_0 are undefined for ' + mineral.to_string()))
+            mineral_props = dict((name, props[name][row].copy()) for name in property_names)
+            _share_result((fingerprint, state), mineral_props)
+            for idx in indices:
+                results[idx] = mineral_props
+
+    if cache is not None:
+        # only keep the minerals of this evaluation, so that the cache does
+        # not grow with every change of the parameters
+        cache.state = state
+        cache.results = dict((fingerprint, props) for (fingerprint, props) in zip(fingerprints, results) \
+                                 if fingerprint is not None)
+    return results
+
+
+def evaluate_pointwise(mineral, pressures, temperatures):
+    """
+    Compute the thermoelastic properties of a single mineral one pressure
+    and temperature at a time, using the parameters returned by
+    :func:`burnman.material.params_at`. This works for every mineral,
+    including those whose parameters change with the state, and does not
+    change the state of the mineral. Minerals that can return their
+    parameters for all states at once, like
+    :func:`burnman.minerals_base.helper_fe_dependent.params_along`, are
+    solved in a single vectorized call instead.
+
+    :returns: dictionary with one array for each of property_names
+    :rtype: dictionary
+    """
+    if hasattr(mineral, 'params_along'):
+        try:
+            params = mineral.params_along(pressures, temperatures)
+            if not (params.has_key('G_0') and params.has_key('Gprime_0')):
+                warnings.warn(('Warning: G_0 and or Gprime_0 are undefined for ' + mineral.to_string()))
+            return mineral_properties(mineral.method, params, np.asarray(pressures, dtype=float),
+                                      np.asarray(temperatures, dtype=float))
+        except NotImplementedError:
+            pass # evaluate one state at a time
+
+    props = dict((name, np.empty(len(pressures))) for name in property_names)
+    for idx in range(len(pressures)):
+        params = mineral.params_at(pressures[idx], temperatures[idx])
+        if not (params.has_key('G_0') and params.has_key('Gprime_0')):
+            warnings.warn(('Warning: G_0 and or Gprime_0 are undefined for ' + mineral.to_string()))
+        point = state_properties(mineral.method, params, pressures[idx], temperatures[idx])
+        for name in property_names:
+            props[name][idx] = point[name]
+    return props
+
+
+def average_phases(fractions, V, rho, K, G, averaging_scheme):
+    """
+    Average the properties of several phases along a profile.
+
+    :type fractions: list of float
+    :param fractions: molar fraction of each phase
+
+    :param V, rho, K, G: molar volumes, densities, bulk and shear moduli of
+      the phases, arrays of shape (n_phases, n_evaluation_points)
+
+    :type averaging_scheme: :class:`burnman.averaging_schemes.averaging_scheme`
+    :param averaging_scheme: Averaging scheme to use.
+
+    :returns: density[kg/m^3], bulk modulus K[Pa], shear modulus G[Pa]
+    :rtype: arrays of floats
+    """
+    V_frac = np.asarray(fractions, dtype=float)[:, np.newaxis] * V
+    if averaging_scheme.vectorized:
+        return averaging_scheme.average_density(V_frac, rho), \
+            averaging_scheme.average_bulk_moduli(V_frac, K, G), \
+            averaging_scheme.average_shear_moduli(V_frac, K, G)
+
+    n_points = V.shape[1]
+    rho_avg = np.empty(n_points)
+    K_avg = np.empty(n_points)
+    G_avg = np.empty(n_points)
+    for idx in range(n_points):
+        rho_avg[idx] = averaging_scheme.average_density(V_frac[:,idx], rho[:,idx])
+        K_avg[idx] = averaging_scheme.average_bulk_moduli(V_frac[:,idx], K[:,idx], G[:,idx])
+        G_avg[idx] = averaging_scheme.average_shear_moduli(V_frac[:,idx], K[:,idx], G[:,idx])
+    return rho_avg, K_avg, G_avg
+
+
+def densities(rocks, pressures, temperatures, averaging_scheme=averaging_schemes.voigt_reuss_hill()):
+    """
+    Compute only the densities of several rocks along profiles, for example
+    to convert pressures to depths for many candidate compositions. Only
+    the volumes of the minerals are solved: the minerals with static
+    parameters of all rocks are grouped by their equation of state and
+    solved in one vectorized call per group, each rock at its own
+    temperatures. Rocks whose phases depend on the state are evaluated with
+    :func:`evaluate`. Like :func:`evaluate`, this does not change the state
+    of the rocks.
+
+    :type rocks: list of :class:`burnman.abstract_material`
+    :param rocks: the rocks to evaluate
+
+    :type pressures: list of float
+    :param pressures: list of pressures you want to evaluate the rocks at. In [Pa].
+
+    :type temperatures: array of float
+    :param temperatures: temperatures in [K], either one profile for all
+                         rocks or an array of shape (n_rocks, n_evaluation_points)
+
+    :type averaging_scheme: :class:`burnman.averaging_schemes.averaging_scheme`
+    :param averaging_scheme: Averaging scheme to use.
+
+    :returns: densities [kg/m^3] of shape (n_rocks, n_evaluation_points)
+    :rtype: array of float
+    """
+    pressures = np.asarray(pressures, dtype=float)
+    temperatures = np.asarray(temperatures, dtype=float) * np.ones((len(rocks), len(pressures)))
+    result = np.empty((len(rocks), len(pressures)))
+
+    # volumes and densities of the phases of each rock, filled in below
+    phases = {}
+    rows = []
+    for (member, rock) in enumerate(rocks):
+        unrolled = rock.static_unroll()
+        if unrolled is None:
+            result[member] = evaluate(rock, pressures, temperatures[member], averaging_scheme)['rho']
+            continue
+        (fractions, minerals) = unrolled
+        phases[member] = (fractions, np.empty((len(minerals), len(pressures))), np.empty((len(minerals), len(pressures))))
+        for (row, mineral) in enumerate(minerals):
+            fingerprint = mineral_fingerprint(mineral)
+            if fingerprint is None:
+                props = evaluate_pointwise(mineral, pressures, temperatures[member])
+                phases[member][1][row] = props['V']
+                phases[member][2][row] = props['rho']
+                continue
+            rows.append((member, row, mineral, fingerprint))
+
+    for (method, params, indices) in group_minerals([mineral for (member, row, mineral, fingerprint) in rows],
+                                                    [fingerprint for (member, row, mineral, fingerprint) in rows]):
+        members = [rows[idx][0] for idx in indices]
+        props = evaluate_group(method, params, pressures[np.newaxis, :], temperatures[members], volume_only=True)
+        for (i, idx) in enumerate(indices):
+            (member, row) = rows[idx][:2]
+            phases[member][1][row] = props['V'][i]
+            phases[member][2][row] = props['rho'][i]
+
+    for (member, (fractions, V, rho)) in phases.items():
+        V_frac = np.asarray(fractions, dtype=float)[:, np.newaxis] * V
+        if averaging_scheme.vectorized:
+            result[member] = averaging_scheme.average_density(V_frac, rho)
+        else:
+            result[member] = [averaging_scheme.average_density(V_frac[:,idx], rho[:,idx]) for idx in range(len(pressures))]
+    return result
+
+
+def evaluate(rock, pressures, temperatures, averaging_scheme=averaging_schemes.voigt_reuss_hill()):
+    """
+    Compute the density, seismic velocities and moduli of a rock (or a single
+    mineral) at the given pressures and temperatures. In contrast to
+    :func:`burnman.velocities_from_rock` this does not call set_state(), so
+    neither the rock nor its minerals are changed, and the same rock can be
+    evaluated from several threads at once::
+
+        pool = multiprocessing.pool.ThreadPool(4)
+        results = pool.map(lambda T: burnman.evaluate(rock, pressures, T), geotherms)
+
+    The equation of state of every mineral has to be set before, see
+    :func:`burnman.abstract_material.set_method`.
+
+    :param burnman.abstract_material rock: this is a rock
+
+    :type pressures: list of float
+    :param pressures: list of pressures you want to evaluate the rock at. In [Pa].
+
+    :type temperatures: list of float
+    :param temperatures: list of temperatures you want to evaluate the rock at. In [K].
+
+    :type averaging_scheme: :class:`burnman.averaging_schemes.averaging_scheme`
+    :param averaging_scheme: Averaging scheme to use.
+
+    :returns: dictionary with arrays for the density 'rho' [kg/m^3], the
+      velocities 'v_p', 'v_s' and 'v_phi' [m/s], and the adiabatic bulk and
+      the shear modulus 'K_S' and 'G' [Pa]
+    :rtype: dictionary
+    """
+    pressures = np.asarray(pressures, dtype=float)
+    temperatures = np.asarray(temperatures, dtype=float)
+
+    unrolled = rock.static_unroll()
+    if unrolled is not None:
+        (fractions, minerals) = unrolled
+        props = evaluate_phases(minerals, pressures, temperatures)
+        rho, K, G = average_phases(fractions, np.array([p['V'] for p in props]),
+                                   np.array([p['rho'] for p in props]),
+                                   np.array([p['K_S'] for p in props]),
+                                   np.array([p['G'] for p in props]), averaging_scheme)
+    else:
+        # the minerals and their parameters depend on the state, evaluate
+        # them one point at a time
+        rho = np.empty(len(pressures))
+        K = np.empty(len(pressures))
+        G = np.empty(len(pressures))
+        for idx in range(len(pressures)):
+            (fractions, minerals) = rock.unroll_at(pressures[idx], temperatures[idx])
+            props = [evaluate_pointwise(mineral, pressures[idx:idx+1], temperatures[idx:idx+1]) \
+                         for mineral in minerals]
+            rho[idx], K[idx], G[idx] = average_phases(fractions, np.array([p['V'] for p in props]),
+                                                      np.array([p['rho'] for p in props]),
+                                                      np.array([p['K_S'] for p in props]),
+                                                      np.array([p['G'] for p in props]), averaging_scheme)
+
+    return {'rho': rho, 'K_S': K, 'G': G,
+            'v_p': np.sqrt( (K + 4./3.*G) / rho),
+            'v_s': np.sqrt( G / rho),
+            'v_phi': np.sqrt( K / rho)}
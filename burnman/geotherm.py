@@ -3,9 +3,9 @@
 # Released under GPL v2 or later.
 
 import numpy as np
-import matplotlib.pyplot as pyplot
 import scipy.integrate as integrate
 import burnman
+from collections import OrderedDict
 from tools import *
 
 
@@ -15,13 +15,8 @@ def watson_baxter(pressure):
     pressure: in Pa
     returns: temperature in K
     """
-    temperature = np.empty_like(pressure)
-    for i in range(len(pressure)):
-      if (pressure[i] <= 15.e9):
-          temperature[i] = 1900.-1420.*pow(0.8,pressure[i]/1.e9)
-      else:
-          temperature[i] = 1680.+11.1*pressure[i]/1.e9
-    return temperature
+    pressure = np.asarray(pressure, dtype=float)
+    return np.where(pressure <= 15.e9, 1900.-1420.*np.power(0.8,pressure/1.e9), 1680.+11.1*pressure/1.e9)
 
 
 
@@ -33,11 +28,9 @@ def brown_shankland(pressure):
     pressure: in Pa
     returns: temperature in K
     """
-    temperature = np.empty_like(pressure)
-    for i in range(len(pressure)):
-      depth = burnman.seismic.prem_model.depth(pressure[i])
-      temperature[i] = lookup_and_interpolate(table_brown_depth, table_brown_temperature, depth)    
-    return temperature
+    table = cached_table("input_geotherm/brown_81.txt")
+    depths = burnman.seismic.prem_model.depth(np.asarray(pressure, dtype=float))
+    return interpolate(interpolation_weights(table[:,0], depths), table[:,1])
 
 # geotherm from Anderson 1982
 def anderson(pressure):
@@ -46,13 +39,11 @@ def anderson(pressure):
     pressure: in Pa
     returns: temperature in K
     """
-    temperature = np.empty_like(pressure)
-    for i in range(len(pressure)):
-      depth = burnman.seismic.prem_model.depth(pressure[i])
-      temperature[i] = lookup_and_interpolate(table_anderson_depth, table_anderson_temperature, depth)    
-    return temperature
+    table = cached_table("input_geotherm/anderson_82.txt")
+    depths = burnman.seismic.prem_model.depth(np.asarray(pressure, dtype=float))
+    return interpolate(interpolation_weights(table[:,0], depths), table[:,1])
 
-def adiabatic(pressures, T0, rock):
+def adiabatic(pressures, T0, rock, cache=None):
     """
     This integrates dT/dP = gr * T / K_s  in order to get a mantle adiabat
     at the pressures given.  Takes pressures in Pa, as well as an anchor
@@ -61,11 +52,89 @@ def adiabatic(pressures, T0, rock):
     for which we compute the adiabat.  For more info see the documentation
     on dTdP
 
+    If an :class:`adiabat_cache` is given, the adiabat is interpolated from
+    the cache and only integrated where the cached pressure range has to be
+    extended.
+
     Returns: a list of temperatures [K]  for each of the pressures [Pa]
     """
+    if cache is not None:
+        temperatures = cache.temperatures(pressures, T0, rock)
+        if temperatures is not None:
+            return temperatures
     temperatures = integrate.odeint(lambda t,p : dTdP(t,p,rock), T0, pressures)
     return temperatures.ravel()
 
+def isentrope(pressures, T0, rock, tol=1.e-10, max_iterations=50):
+    """
+    Computes the same adiabat as :func:`adiabatic`, but instead of
+    integrating dT/dP from the first pressure, the temperature at every
+    pressure is found independently, such that the entropy of the rock
+    equals its entropy at the first pressure and T0. The entropy of the
+    rock is the sum of the vibrational entropies of its minerals weighted by
+    their molar fractions, so this needs equations of state that provide
+    the entropy (slb and mgd, but not bm). Across a spin transition the
+    entropy of a mineral jumps, so there the isentrope differs from the
+    adiabat of :func:`adiabatic`, which follows the slope of each side.
+
+    All pressures are solved together with a Newton iteration using
+    dS/dT = C_p/T, which is vectorized over the pressures for minerals with
+    static parameters (see :func:`burnman.material.static_params`). Rocks
+    whose minerals or fractions depend on the state are unrolled at every
+    point with unroll_at(). The state of the rock is not changed.
+
+    :param pressures: list of pressures [Pa]
+    :param T0: anchor temperature [K] at the first pressure
+    :param rock: instance of burnman.composite
+    :param tol: relative tolerance for the temperatures
+    :param max_iterations: number of Newton iterations after which a
+                           ValueError is raised if the temperatures have
+                           not converged
+
+    Returns: array of temperatures [K] for each of the pressures [Pa]
+    """
+    pressures = np.asarray(pressures, dtype=float)
+    unrolled = rock.static_unroll()
+    S0 = _entropy(rock, unrolled, pressures[:1], np.array([float(T0)]))[0][0]
+
+    temperatures = T0*np.ones(len(pressures))
+    for i in range(max_iterations):
+        (S, C_p) = _entropy(rock, unrolled, pressures, temperatures)
+        correction = (S0 - S)*temperatures/C_p
+        temperatures = temperatures + correction
+        if np.all(np.abs(correction) <= tol*temperatures):
+            return temperatures
+    raise ValueError("the isentrope did not converge in %d iterations" % max_iterations)
+
+def _entropy(rock, unrolled, pressures, temperatures):
+    """
+    Returns the entropy [J/K/mol] and heat capacity at constant pressure
+    [J/K/mol] of the rock at each pressure and temperature. unrolled are the
+    fractions and minerals of the rock, or None if they depend on the state.
+    """
+    S = np.zeros(len(pressures))
+    C_p = np.zeros(len(pressures))
+    if unrolled is None:
+        for i in range(len(pressures)):
+            (S[i:i+1], C_p[i:i+1]) = _entropy(rock, rock.unroll_at(pressures[i], temperatures[i]), \
+                                              pressures[i:i+1], temperatures[i:i+1])
+        return (S, C_p)
+    (fractions, minerals) = unrolled
+    for (fr, mineral) in zip(fractions, minerals):
+        params = mineral.static_params()
+        if params is not None:
+            method = mineral.method
+            V = method.vectorized_volume(pressures, temperatures, params)
+            S += fr*method.entropy(pressures, temperatures, V, params)
+            C_p += fr*method.heat_capacity_p(pressures, temperatures, V, params)
+            continue
+        for i in range(len(pressures)):
+            params = mineral.params_at(pressures[i], temperatures[i])
+            V = mineral.method.volume(pressures[i], temperatures[i], params)
+            S[i] += fr*mineral.method.entropy(pressures[i], temperatures[i], V, params)
+            C_p[i] += fr*mineral.method.heat_capacity_p(pressures[i], temperatures[i], V, params)
+    return (S, C_p)
+
 def dTdP(temperature, pressure, rock):
     """
     ODE to integrate temperature with depth for a composite material
@@ -94,16 +163,266 @@ def dTdP(temperature, pressure, rock):
     return temperature*top/bottom
 
 
-table_brown = read_table("input_geotherm/brown_81.txt")
-table_brown_depth = np.array(table_brown)[:,0]
-table_brown_temperature = np.array(table_brown)[:,1]
+class adiabat_gradient:
+    """
+    Vectorized right hand side of the adiabat, dT/dP as in :func:`dTdP`,
+    for an ensemble of rocks that are each at their own temperature.
+    The minerals of all rocks with static parameters are grouped by
+    equation of state (see :func:`burnman.evaluation.group_minerals`)
+    and their parameters are stacked into one row per mineral and member,
+    so each group is evaluated in one call for all members. Rocks whose
+    minerals depend on the state are evaluated with :func:`dTdP`.
+
+    :param rocks: list of the rocks (instances of burnman.composite) of the
+                  ensemble members
+    """
+    def __init__(self, rocks):
+        self.rocks = rocks
+        self.pointwise = []
+        phases = []
+        for (member, rock) in enumerate(rocks):
+            unrolled = rock.static_unroll()
+            fingerprints = None
+            if unrolled is not None:
+                fingerprints = [burnman.evaluation.mineral_fingerprint(mineral) for mineral in unrolled[1]]
+            if fingerprints is None or None in fingerprints:
+                self.pointwise.append(member)
+                continue
+            phases.extend((member, fraction, mineral, fingerprint) \
+                              for (fraction, mineral, fingerprint) in zip(unrolled[0], unrolled[1], fingerprints))
+
+        self.groups = []
+        for (method, params, indices) in burnman.evaluation.group_minerals([phase[2] for phase in phases],
+                                                                           [phase[3] for phase in phases]):
+            self.groups.append((method, params, np.array([phases[idx][0] for idx in indices]),
+                                np.array([phases[idx][1] for idx in indices], dtype=float)))
+
+    def __call__(self, pressure, temperatures):
+        """
+        Returns dT/dP [K/Pa] for all members at the given pressure [Pa] and
+        array of temperatures [K], one for each member.
+        """
+        n = len(self.rocks)
+        top = np.zeros(n)
+        bottom = np.zeros(n)
+        for (method, params, members, fractions) in self.groups:
+            props = burnman.evaluation.evaluate_group(method, params, pressure, temperatures[members][:, np.newaxis])
+            top += np.bincount(members, fractions*(props['gr']*props['C_p']/props['K_S'])[:, 0], minlength=n)
+            bottom += np.bincount(members, fractions*props['C_p'][:, 0], minlength=n)
+        gradient = temperatures*top/np.where(bottom == 0., 1., bottom)
+        for member in self.pointwise:
+            gradient[member] = dTdP(temperatures[member], pressure, self.rocks[member])
+        return gradient
+
+
+# Dormand-Prince 5(4) coefficients
+_dp_c = [0., 1./5., 3./10., 4./5., 8./9., 1., 1.]
+_dp_a = [[],
+         [1./5.],
+         [3./40., 9./40.],
+         [44./45., -56./15., 32./9.],
+         [19372./6561., -25360./2187., 64448./6561., -212./729.],
+         [9017./3168., -355./33., 46732./5247., 49./176., -5103./18656.],
+         [35./384., 0., 500./1113., 125./192., -2187./6784., 11./84.]]
+_dp_error = [71./57600., 0., -71./16695., 71./1920., -17253./339200., 22./525., -1./40.]
+
+
+def adiabats(pressures, T0s, rocks, steps=None, rtol=1.e-8):
+    """
+    Integrates the adiabats for several anchor temperatures, and optionally
+    several rocks, together in one pass. This is the ensemble version of
+    :func:`adiabatic`: all members share the pressure steps, and dT/dP is
+    evaluated for all members at once by :class:`adiabat_gradient`.
+
+    :param pressures: list of pressures [Pa], the first one is the pressure
+                      of the anchor temperatures
+    :param T0s: list of anchor temperatures [K], one for each member
+    :param rocks: either a single rock (instance of burnman.composite) that
+                  is used for all members, or a list with one rock for each
+                  member
+    :param steps: if given, the number of steps of the classical fourth
+                  order Runge-Kutta scheme between two pressures. By default
+                  the Dormand-Prince scheme with adaptive steps is used.
+    :param rtol: relative tolerance of the adaptive scheme
+
+    Returns: array of temperatures [K] of shape (len(T0s), len(pressures))
+    """
+    pressures = np.asarray(pressures, dtype=float)
+    T = np.array(T0s, dtype=float).ravel()
+    if not isinstance(rocks, (list, tuple)):
+        rocks = [rocks]*len(T)
+    if len(rocks) != len(T):
+        raise ValueError("need one anchor temperature for each rock")
+    gradient = adiabat_gradient(rocks)
+
+    if steps is None:
+        return _adaptive(gradient, pressures, T, rtol)[0]
+
+    temperatures = np.empty((len(T), len(pressures)))
+    temperatures[:, 0] = T
+    for i in range(1, len(pressures)):
+        dP = (pressures[i]-pressures[i-1])/steps
+        for j in range(steps):
+            P = pressures[i-1] + j*dP
+            k1 = gradient(P, T)
+            k2 = gradient(P + 0.5*dP, T + 0.5*dP*k1)
+            k3 = gradient(P + 0.5*dP, T + 0.5*dP*k2)
+            k4 = gradient(P + dP, T + dP*k3)
+            T = T + dP*(k1 + 2.*k2 + 2.*k3 + k4)/6.
+        temperatures[:, i] = T
+    return temperatures
+
+def _adaptive(gradient, pressures, T, rtol):
+    """
+    Integrates with the adaptive Dormand-Prince scheme from the first to all
+    other pressures and returns the temperatures and their derivatives dT/dP,
+    both of shape (len(T), len(pressures)).
+    """
+    temperatures = np.empty((len(T), len(pressures)))
+    derivatives = np.empty((len(T), len(pressures)))
+    dT = gradient(pressures[0], T)
+    temperatures[:, 0] = T
+    derivatives[:, 0] = dT
+    h = None
+    for i in range(1, len(pressures)):
+        (T, dT, h) = _dormand_prince(gradient, pressures[i-1], pressures[i], T, dT, h, rtol)
+        temperatures[:, i] = T
+        derivatives[:, i] = dT
+    return (temperatures, derivatives)
+
+def _dormand_prince(gradient, P_start, P_end, T, dT, h, rtol, max_steps=10000, h_min=None):
+    """
+    Adaptive integration from P_start to P_end with a step size shared by
+    all members, chosen so that the error estimate of every member is below
+    rtol. Returns the temperatures and gradients at P_end and the step size
+    to try next. Raises a ValueError if the gradient is not finite, or if
+    the integration needs more than max_steps steps (accepted or rejected)
+    or a step smaller than h_min [Pa] (by default 1e-12 of the pressures).
+    """
+    P = P_start
+    direction = 1. if P_end >= P_start else -1.
+    if h is None:
+        h = abs(P_end - P_start)
+    if h_min is None:
+        h_min = 1.e-12*max(abs(P_start), abs(P_end))
+    steps = 0
+    while P != P_end:
+        steps += 1
+        if steps > max_steps:
+            raise ValueError("the adiabat needs more than %d steps from %g to %g Pa" % (max_steps, P_start, P_end))
+        remaining = abs(P_end - P)
+        last = h >= remaining
+        step = direction*(remaining if last else h)
+        k = [dT]
+        for stage in range(1, 7):
+            T_stage = T + step*sum(a*ki for (a, ki) in zip(_dp_a[stage], k) if a != 0.)
+            k.append(gradient(P + _dp_c[stage]*step, T_stage))
+        error = np.max(np.abs(step*sum(e*ki for (e, ki) in zip(_dp_error, k) if e != 0.)) \
+                           / (rtol*np.maximum(np.abs(T), np.abs(T_stage))))
+        if not np.isfinite(error):
+            raise ValueError("the gradient of the adiabat is not finite at %g Pa" % P)
+        if error <= 1.:
+            P = P_end if last else P + step
+            (T, dT) = (T_stage, k[6])
+        h = abs(step)*min(5., max(0.2, 0.9*(1./max(error, 1.e-10))**0.2))
+        if P != P_end and h < h_min:
+            raise ValueError("the step size of the adiabat fell below %g Pa at %g Pa" % (h_min, P))
+    return (T, dT, h)
+
+
+class adiabat_cache:
+    """
+    Stores the adiabats computed by :func:`adiabatic` for each rock and
+    anchor, so that adiabats for other pressures of the same rock and
+    anchor are interpolated instead of integrated again. This helps scripts
+    that request the same adiabat repeatedly on slightly different pressure
+    arrays, for example to plot it on a finer grid than it was fitted on::
+
+        cache = burnman.geotherm.adiabat_cache()
+        temperatures = burnman.geotherm.adiabatic(pressures, T0, rock, cache)
+        fine = burnman.geotherm.adiabatic(fine_pressures, T0, rock, cache)
+
+    The adiabat is identified by the first of the pressures, so both arrays
+    have to start at the pressure of the anchor temperature T0.
+
+    Every adiabat is stored as temperatures and derivatives dT/dP at nodes
+    at most node_spacing apart, and interpolated with cubic Hermite
+    polynomials. If a request reaches beyond the pressures covered so far,
+    only the missing part is integrated, starting from the last node.
+    Adiabats are identified by the parameters of the minerals of the rock
+    (see :func:`burnman.evaluation.mineral_fingerprint`), so changing the
+    parameters of a rock gives a new adiabat. Rocks with minerals whose
+    parameters depend on the state are not cached.
+
+    :param max_entries: number of adiabats to keep, the least recently used
+                        ones are dropped first
+    """
+    node_spacing = 5.e9
+    rtol = 1.e-8
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.adiabats = OrderedDict()
+
+    def temperatures(self, pressures, T0, rock):
+        """
+        Returns the temperatures [K] on the adiabat through T0 at the first
+        of the given pressures [Pa], or None if the rock can not be cached.
+        """
+        unrolled = rock.static_unroll()
+        if unrolled is None:
+            return None
+        fingerprints = tuple(burnman.evaluation.mineral_fingerprint(mineral) for mineral in unrolled[1])
+        if None in fingerprints:
+            return None
+        pressures = np.asarray(pressures, dtype=float)
+        key = (tuple(unrolled[0]), fingerprints, float(pressures[0]), float(T0))
+
+        nodes = self.adiabats.pop(key, None)
+        if nodes is None:
+            nodes = (pressures[:1], np.array([float(T0)]), np.array([dTdP(float(T0), pressures[0], rock)]))
+        nodes = self._extend(nodes, np.min(pressures), np.max(pressures), rock)
+        self.adiabats[key] = nodes
+        while len(self.adiabats) > self.max_entries:
+            self.adiabats.popitem(last=False)
+        return self._interpolate(nodes, pressures)
+
+    def _extend(self, nodes, P_min, P_max, rock):
+        # a single adiabat is faster to evaluate point by point than through
+        # adiabat_gradient, which pays off for larger ensembles only
+        gradient = lambda pressure, temperatures: np.array([dTdP(temperatures[0], pressure, rock)])
+        (P, T, dT) = nodes
+        if P_max > P[-1]:
+            n = int(np.ceil((P_max - P[-1])/self.node_spacing))
+            new_P = np.linspace(P[-1], P[-1] + n*self.node_spacing, n+1)
+            (new_T, new_dT) = _adaptive(gradient, new_P, T[-1:], self.rtol)
+            (P, T, dT) = (np.hstack((P, new_P[1:])), np.hstack((T, new_T[0, 1:])), np.hstack((dT, new_dT[0, 1:])))
+        if P_min < P[0]:
+            n = int(np.ceil((P[0] - P_min)/self.node_spacing))
+            new_P = np.linspace(P[0], P[0] - n*self.node_spacing, n+1)
+            (new_T, new_dT) = _adaptive(gradient, new_P, T[:1], self.rtol)
+            (P, T, dT) = (np.hstack((new_P[:0:-1], P)), np.hstack((new_T[0, :0:-1], T)), np.hstack((new_dT[0, :0:-1], dT)))
+        return (P, T, dT)
+
+    def _interpolate(self, nodes, pressures):
+        (P, T, dT) = nodes
+        if len(P) == 1:
+            return T[0]*np.ones(len(pressures))
+        upper = np.clip(np.searchsorted(P, pressures), 1, len(P)-1)
+        lower = upper - 1
+        h = P[upper] - P[lower]
+        t = (pressures - P[lower])/h
+        # cubic Hermite basis functions
+        h00 = (1. + 2.*t)*(1. - t)*(1. - t)
+        h10 = t*(1. - t)*(1. - t)
+        h01 = t*t*(3. - 2.*t)
+        h11 = t*t*(t - 1.)
+        return h00*T[lower] + h10*h*dT[lower] + h01*T[upper] + h11*h*dT[upper]
 
-table_anderson = read_table("input_geotherm/anderson_82.txt")
-table_anderson_depth = np.array(table_anderson)[:,0]
-table_anderson_temperature = np.array(table_anderson)[:,1]
 
 # test geotherm
 if __name__ == "__main__":
+    import matplotlib.pyplot as pyplot
     p = np.arange(1.0e9,128.0e9,3e9)
   
     pyrolite = burnman.composite( [ (burnman.minerals.SLB_2011.mg_fe_perovskite(0.2), 0.8), (burnman.minerals.SLB_2011.ferropericlase(0.4), 0.2) ] )
@@ -3,13 +3,14 @@
 # Released under GPL v2 or later.
 
 import os, sys, numpy as np
-import matplotlib.pyplot as plt
 import scipy.integrate as integrate
 
 import seismic
 import tools
 import averaging_schemes
 import geotherm
+import evaluation
+import misfit
 
 #phase = namedtuple('phase', ['mineral', 'fraction'])
 
@@ -42,6 +43,12 @@ def calculate_moduli(rock, pressures, temperatures):
     Given a composite and a list of pressures [Pa] and temperatures [K],
     calculate the elastic moduli and densities of the individual phases.
 
+    If the minerals of the rock have static parameters, all points are
+    evaluated at once without calling set_state(), so the state of the
+    rock is not changed. Otherwise the state is set at every point in
+    turn. In both cases, do not rely on the state of the rock afterwards,
+    call set_state() if you need it.
+
     :param burnman.abstract_material rock: this is a rock
 
     :type pressures: list of float
@@ -60,6 +67,24 @@ def calculate_moduli(rock, pressures, temperatures):
 
     answer = [[] for p in pressures]
 
+    unrolled = rock.static_unroll()
+    if unrolled is not None:
+        # evaluate all phases for all points at once, grouped by their
+        # equation of state
+        (fractions,minerals) = unrolled
+        phase_properties = evaluation.evaluate_phases(minerals, pressures, temperatures, \
+                                                          getattr(rock, 'profile_cache', None))
+        for idx in range(len(pressures)):
+            for (fraction,props) in zip(fractions,phase_properties):
+                e = elastic_properties()
+                e.V = fraction * props['V'][idx]
+                e.K = props['K_S'][idx]
+                e.G = props['G'][idx]
+                e.rho = props['rho'][idx]
+                e.fraction = fraction
+                answer[idx].append(e)
+        return answer
+
     for idx in range(len(pressures)):
         rock.set_state(pressures[idx], temperatures[idx])
         (fractions,minerals) = rock.unroll()
@@ -141,14 +166,83 @@ def compute_velocities(moduli):
     return mat_vp, mat_vs, mat_vphi
  
  
-def velocities_from_rock(rock, pressures, temperatures, averaging_scheme=averaging_schemes.voigt_reuss_hill()):
+class phase_properties:
+    """
+    Class that contains the volumes, densities and moduli of a list of
+    minerals along a profile of pressures and temperatures. The equations of
+    state are solved once when the object is created; afterwards the
+    minerals can be averaged for any set of molar fractions without solving
+    them again, which makes scans over the composition of a rock cheap::
+
+        props = burnman.phase_properties([pv, fp], pressures, temperatures)
+        for x in np.linspace(0., 1., 200):
+            rho, vp, vs, vphi, K, G = props.velocities([x, 1.-x])
+
+    :var list minerals: the minerals
+    :var array V: molar volumes [m^3/mol] of shape (n_phases, n_evaluation_points)
+    :var array rho: densities [kg/m^3] of the same shape
+    :var array K: adiabatic bulk moduli [Pa] of the same shape
+    :var array G: shear moduli [Pa] of the same shape
+    """
+
+    def __init__(self, minerals, pressures, temperatures, cache=None):
+        """
+        Solve the equations of state of the minerals at the given pressures
+        [Pa] and temperatures [K], see
+        :func:`burnman.evaluation.evaluate_phases`. If a
+        :class:`burnman.evaluation.profile_cache` is given, only minerals
+        that changed since its last evaluation are solved.
+        """
+        self.minerals = minerals
+        self.pressures = np.asarray(pressures, dtype=float)
+        self.temperatures = np.asarray(temperatures, dtype=float)
+        props = evaluation.evaluate_phases(minerals, self.pressures, self.temperatures, cache)
+        self.V = np.array([p['V'] for p in props])
+        self.rho = np.array([p['rho'] for p in props])
+        self.K = np.array([p['K_S'] for p in props])
+        self.G = np.array([p['G'] for p in props])
+
+    def average(self, fractions, averaging_scheme=averaging_schemes.voigt_reuss_hill()):
+        """
+        Average the properties of the minerals for the given molar fractions.
+
+        :type fractions: list of float
+        :param fractions: molar fraction of each mineral
+
+        :type averaging_scheme: :class:`burnman.averaging_schemes.averaging_scheme`
+        :param averaging_scheme: Averaging scheme to use.
+
+        :returns: density[kg/m^3], bulk modulus K[Pa], shear modulus G[Pa]
+        :rtype: arrays of floats
+        """
+        return evaluation.average_phases(fractions, self.V, self.rho, self.K, self.G, averaging_scheme)
+
+    def velocities(self, fractions, averaging_scheme=averaging_schemes.voigt_reuss_hill()):
+        """
+        Average the minerals for the given molar fractions (see
+        :func:`average`) and compute the seismic velocities.
+
+        :returns: density[kg/m^3], Vp[m/s],Vs[m/s],Vphi[m/s], bulk modulus K[Pa],shear modulus G[Pa]
+        :rtype: arrays of floats
+        """
+        rho, K, G = self.average(fractions, averaging_scheme)
+        mat_vs = np.sqrt( G / rho)
+        mat_vp = np.sqrt( (K + 4./3.*G) / rho)
+        mat_vphi = np.sqrt( K / rho)
+        return rho, mat_vp, mat_vs, mat_vphi, K, G
+
+
+def velocities_from_rock(rock, pressures, temperatures, averaging_scheme=averaging_schemes.voigt_reuss_hill(), Q=None):
     """
     A function that rolls several steps into one: given a rock and a list of
     pressures and temperatures, it calculates the elastic moduli of the
     individual phases using calculate_moduli(), averages them using
     average_moduli(), and calculates the seismic velocities using
-    compute_velocities().
+    compute_velocities(). If quality factors Q are given, the velocities are
+    corrected for attenuation, see :func:`apply_attenuation_correction`.
 
+    Like calculate_moduli(), this does not leave the rock in a defined
+    state, call set_state() if you need it afterwards.
 
     :param burnman.abstract_material rock: this is a rock
 
@@ -162,84 +256,168 @@ def velocities_from_rock(rock, pressures, temperatures, averaging_scheme=averagi
     :type averaging_scheme: :class:`burnman.averaging_schemes.averaging_scheme`
     :param averaging_scheme: Averaging scheme to use.
 
+    :param Q: optional quality factors for the attenuation correction, a
+              tuple (Qs, Qphi) of floats or arrays, or a seismic model with
+              quality factors, see :func:`quality_factors`.
+
     :returns: density[kg/m^3], Vp[m/s],Vs[m/s],Vphi[m/s], bulk modulus K[Pa],shear modulus G[Pa]
     :rtype: lists of floats
 
     """
-    moduli_list = calculate_moduli(rock, pressures, temperatures)
-    moduli = average_moduli(moduli_list, averaging_scheme)
-    mat_vp, mat_vs, mat_vphi = compute_velocities(moduli)
-    mat_rho = np.array([m.rho for m in moduli])
-    mat_K = np.array([m.K for m in moduli])
-    mat_G = np.array([m.G for m in moduli])
+    unrolled = rock.static_unroll()
+    if unrolled is not None:
+        (fractions,minerals) = unrolled
+        props = phase_properties(minerals, pressures, temperatures, getattr(rock, 'profile_cache', None))
+        (mat_rho, mat_vp, mat_vs, mat_vphi, mat_K, mat_G) = props.velocities(fractions, averaging_scheme)
+    else:
+        moduli_list = calculate_moduli(rock, pressures, temperatures)
+        moduli = average_moduli(moduli_list, averaging_scheme)
+        mat_vp, mat_vs, mat_vphi = compute_velocities(moduli)
+        mat_rho = np.array([m.rho for m in moduli])
+        mat_K = np.array([m.K for m in moduli])
+        mat_G = np.array([m.G for m in moduli])
+
+    if Q is not None:
+        (Qs, Qphi) = quality_factors(Q, pressures)
+        (mat_vp, mat_vs, mat_vphi) = apply_attenuation_correction(mat_vp, mat_vs, mat_vphi, Qs, Qphi)
     return mat_rho, mat_vp, mat_vs, mat_vphi, mat_K, mat_G
 
 def depths_for_rock(rock,pressures, temperatures,averaging_scheme=averaging_schemes.voigt_reuss_hill()):
     """
     Function computes the self-consistent depths (to avoid using the PREM depth-pressure conversion) (Cammarano, 2013).
     It is simplified by taking g from PREM.
+
+    Several rocks, or several temperature profiles, can be converted in one
+    call by passing a list of rocks and/or a two dimensional array of
+    temperatures, their densities are computed together by
+    :func:`burnman.evaluation.densities`.
         
-    :param burnman.abstract_material rock: this is a rock
+    :param burnman.abstract_material rock: this is a rock, or a list of rocks
         
     :type pressures: list of float
     :param pressures: list of pressures you want to evaluate the rock at. In [Pa].
         
     :type temperatures: list of float
     :param temperatures: list of temperatures you want to evaluate the rock at. In [K].
+                         An array of shape (n_profiles, n_pressures) gives one profile for each rock.
         
     :type averaging_scheme: :class:`burnman.averaging_schemes.averaging_scheme`
     :param averaging_scheme: Averaging scheme to use.
         
-    :returns: depth [m]
-    :rtype: list of floats
+    :returns: depth [m], of shape (n_profiles, n_pressures) for several rocks or profiles
+    :rtype: array of floats
     """
-    moduli_list = calculate_moduli(rock, pressures, temperatures)
-    moduli = average_moduli(moduli_list, averaging_scheme)
-    mat_rho = np.array([m.rho for m in moduli])
-    seismic_model = seismic.prem()
-    depthsref = np.array(map(seismic_model.depth,pressures))
-    pressref = np.zeros_like(pressures)
+    pressures = np.asarray(pressures, dtype=float)
+    temperatures = np.asarray(temperatures, dtype=float)
+    batched = isinstance(rock, (list, tuple)) or temperatures.ndim == 2
+    rocks = list(rock) if isinstance(rock, (list, tuple)) else [rock]
+    temperatures = np.atleast_2d(temperatures)
+    if len(rocks) == 1:
+        rocks = rocks*len(temperatures)
+    mat_rho = evaluation.densities(rocks, pressures, temperatures, averaging_scheme)
+
+    seismic_model = seismic.prem_model
+    depthsref = seismic_model.depth(pressures)
     g  = seismic_model.grav(depthsref) # G for prem
-    depths  = np.hstack((depthsref[0],depthsref[0]+integrate.cumtrapz(1./(g*mat_rho),pressures)))
-    return depths
+    depths = depthsref[0] + np.hstack((np.zeros((len(rocks), 1)), integrate.cumtrapz(1./(g*mat_rho), pressures, axis=1)))
+    if batched:
+        return depths
+    return depths[0]
 
-def pressures_for_rock(rock, depths, T0, averaging_scheme=averaging_schemes.voigt_reuss_hill()):
+def pressures_for_rock(rock, depths, T0, averaging_scheme=averaging_schemes.voigt_reuss_hill(), self_consistent_gravity=False):
     """
     Function computes the self-consistent pressures (to avoid using the PREM depth pressure conversion) (Cammarano, 2013).
-    Only simplification is using g from PREM.'
+    Pressure and temperature are integrated together in depth, starting
+    from the PREM pressure at the first depth and the anchor temperature T0:
+
+    dP/dz = rho(P,T) g(z),  dT/dz = dT/dP(P,T) dP/dz
+
+    with dT/dP along the adiabat as in :func:`burnman.geotherm.dTdP`. By
+    default g is taken from PREM, otherwise it is computed from the mass
+    enclosed at each depth, which is the PREM mass inside the first depth
+    minus the mass of the rock above.
     
     :param burnman.abstract_material rock: this is a rock
     
     :type depths: list of float
     :param depths: list of depths you want to evaluate the rock at. In [m].
     
-    :type temperatures: list of float
-    :param temperatures: list of temperatures you want to evaluate the rock at. In[K].
+    :type T0: float
+    :param T0: temperature at the first depth. In [K].
     
     :type averaging_scheme: :class:`burnman.averaging_schemes.averaging_scheme`
     :param averaging_scheme: Averaging scheme to use.
+
+    :type self_consistent_gravity: bool
+    :param self_consistent_gravity: compute gravity from the density of the rock instead of using PREM.
     
     :returns: pressures [Pa]
     :rtype: list of floats
     
     """
-    # use PREM pressures as inital guestimate
-    seismic_model = seismic.prem()
-    pressures,_,_,_,_ = seismic_model.evaluate_all_at(depths)
-    pressref = np.zeros_like(pressures)
-    #gets table with PREM gravities
-    g = seismic_model.grav(depths)
-    #optimize pressures for this composition
-    while nrmse(len(pressures),pressures,pressref)>1.e-6:
-        # calculate density
-        temperatures = geotherm.adiabatic(pressures,T0,rock)
-        moduli_list = calculate_moduli(rock, pressures, temperatures)
-        moduli = average_moduli(moduli_list, averaging_scheme)
-        mat_rho = np.array([m.rho for m in moduli])
-        # calculate pressures
-        pressref = pressures
-        pressures = np.hstack((pressref[0], pressref[0]+integrate.cumtrapz(g*mat_rho,depths)))
-    return pressures
+    return profile_for_rock(rock, depths, T0, averaging_scheme, self_consistent_gravity)[0]
+
+def profile_for_rock(rock, depths, T0, averaging_scheme=averaging_schemes.voigt_reuss_hill(), self_consistent_gravity=False):
+    """
+    Computes the pressures, temperatures and gravity for a rock at the given
+    depths in a single integration, see :func:`pressures_for_rock`. The
+    state of the rock is not changed.
+
+    :returns: pressures [Pa], temperatures [K] and gravitational acceleration [m/s^2]
+    :rtype: tuple of arrays of float
+    """
+    seismic_model = seismic.prem_model
+    depths = np.asarray(depths, dtype=float)
+    P0 = seismic_model.pressure(depths[0])
+    # the same tolerance as the fixed point iteration this replaces, the PREM
+    # gravity is only piecewise linear, which makes tighter tolerances costly
+    rtol = 1.e-6
+    R = seismic_model.earth_radius
+
+    state = _density_and_gradient(rock, averaging_scheme)
+
+    if self_consistent_gravity:
+        G = 6.67408e-11
+        M0 = seismic_model.grav(depths[0])*(R-depths[0])**2/G
+        def rhs(y, depth):
+            (pressure, temperature, mass) = y
+            (rho, dTdP) = state(pressure, temperature)
+            g = G*mass/(R-depth)**2
+            dPdz = rho*g
+            return [dPdz, dTdP*dPdz, -4.*np.pi*(R-depth)**2*rho]
+        solution = integrate.odeint(rhs, [P0, T0, M0], depths, rtol=rtol)
+        return solution[:,0], solution[:,1], G*solution[:,2]/(R-depths)**2
+
+    def rhs(y, depth):
+        (pressure, temperature) = y
+        (rho, dTdP) = state(pressure, temperature)
+        dPdz = rho*seismic_model.grav(depth)
+        return [dPdz, dTdP*dPdz]
+    solution = integrate.odeint(rhs, [P0, T0], depths, rtol=rtol)
+    return solution[:,0], solution[:,1], seismic_model.grav(depths)
+
+def _density_and_gradient(rock, averaging_scheme):
+    """
+    Returns a function of pressure [Pa] and temperature [K] that returns the
+    density [kg/m^3] of the rock and dT/dP [K/Pa] along the adiabat (see
+    :func:`burnman.geotherm.dTdP`), both from one evaluation of its minerals
+    with :func:`burnman.evaluation.state_properties` and without changing
+    the state of the rock. The integration asks for one state at a time,
+    for which this is faster than the vectorized evaluation.
+    """
+    unrolled = rock.static_unroll()
+    def state(pressure, temperature):
+        if unrolled is not None:
+            (fractions, minerals) = unrolled
+        else:
+            (fractions, minerals) = rock.unroll_at(pressure, temperature)
+        props = [evaluation.state_properties(mineral.method, mineral.params_at(pressure, temperature), \
+                                             pressure, temperature) for mineral in minerals]
+        fractions = np.asarray(fractions, dtype=float)
+        (V, rho, gr, C_p, K_S) = [np.array([p[name] for p in props]) for name in ['V', 'rho', 'gr', 'C_p', 'K_S']]
+        density = averaging_scheme.average_density(fractions*V, rho)
+        return density, temperature*np.sum(fractions*gr*C_p/K_S)/np.sum(fractions*C_p)
+    return state
 
 def apply_attenuation_correction(v_p,v_s,v_phi,Qs,Qphi):
     """
@@ -253,22 +431,35 @@ def apply_attenuation_correction(v_p,v_s,v_phi,Qs,Qphi):
     :param Vs: list of P wave velocties. In [m/s].
     :type Vphi: list of float
     :param Vphi: list of P wave velocties. In [m/s].
+    :type Qs: float or list of float
+    :param Qs: shear quality factor, either for all points or one for each point.
+    :type Qphi: float or list of float
+    :param Qphi: bulk quality factor, either for all points or one for each point.
     
     :returns: Vp[m/s],Vs[m/s],Vphi[m/s]
     :rtype: list of floats
     
     """
-    
-    length = len(v_p)
-    ret_v_p = np.zeros(length)
-    ret_v_s = np.zeros(length)
-    ret_v_phi = np.zeros(length)
-    for i in range(length):
-        ret_v_p[i],ret_v_s[i],ret_v_phi[i] = \
-            seismic.attenuation_correction(v_p[i], v_s[i], v_phi[i],Qs,Qphi)
-    
-    return ret_v_p, ret_v_s, ret_v_phi
+    return seismic.attenuation_correction(np.asarray(v_p, dtype=float), np.asarray(v_s, dtype=float), \
+        np.asarray(v_phi, dtype=float), np.asarray(Qs, dtype=float), np.asarray(Qphi, dtype=float))
 
+def quality_factors(Q, pressures):
+    """
+    Returns the shear and bulk quality factors Qs and Qphi at the given
+    pressures [Pa]. Q is either a seismic model with quality factors (for
+    example :class:`burnman.seismic.prem_withQ`), whose QG and QK are
+    looked up at the depths of the pressures in that model, or a pair
+    (Qs, Qphi) of floats or arrays, for example a tuple or a list, which is
+    returned as a tuple.
+    """
+    if hasattr(Q, 'depth'):
+        depths = Q.depth(pressures)
+        return Q.QG(depths), Q.QK(depths)
+    try:
+        (Qs, Qphi) = Q
+    except (TypeError, ValueError):
+        raise ValueError, "Q needs to be a seismic model or a pair (Qs, Qphi) of quality factors"
+    return Qs, Qphi
 
 def compare_l2(depth,calc, obs):
     """
@@ -288,11 +479,7 @@ def compare_l2(depth,calc, obs):
     :returns: array of L2 norms of length N
     :rtype: array of floats
     """
-    err=[]
-    for l in range(len(calc)):
-        err.append(l2(depth,calc[l],obs[l]))
-
-    return err
+    return list(misfit.l2(depth, np.array(calc), np.array(obs)))
 
 def compare_chifactor(calc, obs):
     """
@@ -308,11 +495,7 @@ def compare_chifactor(calc, obs):
     :returns: error array of length N
     :rtype: array of floats
     """
-    err=[]
-    for l in range(len(calc)):
-        err.append(chi_factor(calc[l],obs[l]))
-    
-    return err
+    return list(misfit.chi_factor(np.array(calc), np.array(obs)))
 
 def l2(x,funca,funcb):
     """
@@ -329,16 +512,16 @@ def l2(x,funca,funcb):
     :returns: L2 norm
     :rtype: array of floats
     """
-    diff=np.array(funca-funcb)
-    diff=diff*diff
-    return integrate.trapz(diff,x)
+    return misfit.l2(x, funca, funcb)
 
 
 def nrmse(x,funca,funcb):
     """ 
-    Normalized root mean square error for one profile
+    Normalized root mean square error for one profile, see
+    :func:`burnman.misfit.nrmse`.
     :type x: array of float
-    :param x: depths in m.
+    :param x: depths in m, not used (the mean is taken over the points of
+              the profiles). Kept for compatibility.
     :type funca: list of arrays of float
     :param funca: array calculated values
     :type funcb: list of arrays of float
@@ -348,11 +531,7 @@ def nrmse(x,funca,funcb):
     :rtype: array of floats
     
     """
-    diff=np.array(funca-funcb)
-    diff=diff*diff
-    rmse=np.sqrt(np.sum(diff)/x)
-    nrmse=rmse/(np.max(funca)-np.min(funca))
-    return nrmse
+    return misfit.nrmse(funca, funcb)
 
 def chi_factor(calc,obs):
     """
@@ -366,11 +545,4 @@ def chi_factor(calc,obs):
     :rtype: array of floats
         
     """
-
-    err=np.empty_like(calc)
-    for i in range(len(calc)):
-        err[i]=pow((calc[i]-obs[i])/(0.01*np.mean(obs)),2.)
-
-    err_tot=np.sum(err)/len(err)
-
-    return err_tot
+    return misfit.chi_factor(calc, obs)
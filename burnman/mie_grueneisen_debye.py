@@ -5,7 +5,6 @@
 import numpy as np
 import equation_of_state as eos
 import scipy.optimize as opt
-import matplotlib.pylab as plt
 import birch_murnaghan as bm
 import debye
 
@@ -93,6 +92,13 @@ class mgd_base(eos.equation_of_state):
         C_p = C_v*(1. + gr * alpha * temperature)
         return C_p
 
+    def entropy(self, pressure, temperature, volume, params):
+        """
+        Returns the vibrational entropy at the pressure, temperature, and volume [J/K/mol]
+        """
+        Debye_T = self.__debye_temperature(params['V_0']/volume, params)
+        return debye.entropy(temperature, Debye_T, params['n'])
+
     def adiabatic_bulk_modulus(self,pressure,temperature,volume,params):
         """
         Returns adiabatic bulk modulus [Pa] as a function of pressure [Pa],
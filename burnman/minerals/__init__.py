@@ -6,10 +6,32 @@
 Mineral database
 """
 
-import Murakami_etal_2012
-import Matas_etal_2007
-import SLB_2011
-import SLB_2011_ZSB_2013
-import SLB_2005
-import Murakami_2013
-import other
+import sys as _sys
+import types as _types
+import importlib as _importlib
+
+# the mineral libraries, each is only imported when it is used for the first time
+libraries = ['Murakami_etal_2012', 'Matas_etal_2007', 'SLB_2011', 'SLB_2011_ZSB_2013',
+             'SLB_2005', 'Murakami_2013', 'other']
+# from burnman.minerals import * imports all of them
+__all__ = list(libraries)
+
+class _lazy_package(_types.ModuleType):
+    """
+    Replaces this package in sys.modules and imports the mineral libraries
+    when they are accessed as attributes.
+    """
+    def __getattr__(self, name):
+        if name in libraries:
+            return _importlib.import_module(self.__name__ + '.' + name)
+        raise AttributeError("'module' object has no attribute '%s'" % name)
+
+    def __dir__(self):
+        return sorted(set(self.__dict__.keys() + libraries))
+
+_package = _lazy_package(__name__, __doc__)
+_package.__dict__.update(globals())
+# keep the original module alive, Python clears the globals of a module when
+# it is deleted
+_package._module = _sys.modules[__name__]
+_sys.modules[__name__] = _package
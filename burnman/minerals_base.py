@@ -9,6 +9,8 @@ import warnings
 import slb
 import equation_of_state as eos
 import composite
+import evaluation
+import copy
 
 class material(composite.abstract_material):
     """
@@ -87,11 +89,45 @@ class material(composite.abstract_material):
     def unroll(self):
         return ([1.0],[self])
 
+    def static_unroll(self):
+        return ([1.0],[self])
+
+    def unroll_at(self, pressure, temperature):
+        return ([1.0],[self])
+
+    def static_params(self):
+        """
+        Returns the parameters of this mineral if they do not depend on
+        pressure and temperature, and None otherwise. Minerals with static
+        parameters can be evaluated for many states at once, see
+        :func:`burnman.evaluation.evaluate_phases`.
+        """
+        set_state = self.__class__.set_state
+        if getattr(set_state, '__func__', set_state) is not getattr(material.set_state, '__func__', material.set_state):
+            return None # a derived class may change the parameters in set_state()
+        return self.params
+
+    def params_at(self, pressure, temperature):
+        """
+        Returns the parameters of this mineral at the given pressure [Pa] and
+        temperature [K] without changing the state of the mineral, see
+        :func:`burnman.evaluation.evaluate`. Classes that change the
+        parameters in set_state() should overwrite this, otherwise
+        set_state() is called on a copy of the mineral.
+        """
+        params = self.static_params()
+        if params is None:
+            mineral = copy.deepcopy(self)
+            mineral.set_state(pressure, temperature)
+            params = mineral.params
+        return params
+
     def set_state(self, pressure, temperature):
         """
         Update the material to the given pressure [Pa] and temperature [K].
         
-        This updates the other properties of this class (v_s, v_p, ...).
+        This updates the other properties of this class (v_s, v_p, ...),
+        which are computed by :func:`burnman.evaluation.state_properties`.
         """
 
         #in an effort to avoid additional work, don't do all the calculations if nothing has changed
@@ -105,18 +141,17 @@ class material(composite.abstract_material):
         self.temperature = temperature
         self.old_params = self.params
         
-        self.V = self.method.volume(self.pressure, self.temperature, self.params)
-        self.gr = self.method.grueneisen_parameter(self.pressure, self.temperature, self.V, self.params)
-        self.K_T = self.method.isothermal_bulk_modulus(self.pressure, self.temperature, self.V, self.params)
-        self.K_S = self.method.adiabatic_bulk_modulus(self.pressure, self.temperature, self.V, self.params)
-        self.C_v = self.method.heat_capacity_v(self.pressure, self.temperature, self.V, self.params)
-        self.C_p = self.method.heat_capacity_p(self.pressure, self.temperature, self.V, self.params)
-        self.alpha = self.method.thermal_expansivity(self.pressure, self.temperature, self.V, self.params)
-        
-        if (self.params.has_key('G_0') and self.params.has_key('Gprime_0')):
-            self.G = self.method.shear_modulus(self.pressure, self.temperature, self.V, self.params)
-        else:    
-            self.G = float('nan') #nan if there is no G, this should propagate through calculations to the end
+        props = evaluation.state_properties(self.method, self.params, self.pressure, self.temperature)
+        self.V = props['V']
+        self.gr = props['gr']
+        self.K_T = props['K_T']
+        self.K_S = props['K_S']
+        self.C_v = props['C_v']
+        self.C_p = props['C_p']
+        self.alpha = props['alpha']
+        self.G = props['G']
+
+        if not (self.params.has_key('G_0') and self.params.has_key('Gprime_0')):
             warnings.warn(('Warning: G_0 and or Gprime_0 are undefined for ' + self.to_string()))
 
     def molar_mass(self):
@@ -171,6 +206,11 @@ class material(composite.abstract_material):
         Returns heat capacity at constant pressure of the mineral [J/K/mol]
         """
         return self.C_p
+    def molar_entropy(self):
+        """
+        Returns vibrational entropy of the mineral [J/K/mol]
+        """
+        return self.method.entropy(self.pressure, self.temperature, self.V, self.params)
     def v_s(self):
         """
         Returns shear wave speed of the mineral [m/s]
@@ -222,18 +262,29 @@ class helper_solid_solution(material):
             mat.method = self.method
             mat.set_state(pressure, temperature)
 
+        self.params = self.static_params()
+        material.set_state(self, pressure, temperature)
+
+    def static_params(self):
+        """
+        Returns the molar average of the parameters of the end members, which
+        does not depend on pressure and temperature.
+        """
         itrange = range(0, len(self.base_materials))
 
-        self.params = {}
+        params = {}
 
         # some do arithmetic averaging of the end members
         for prop in self.base_materials[0].params:
            try:
-               self.params[prop] = sum([ self.base_materials[i].params[prop] * self.molar_fraction[i] for i in itrange ])
+               params[prop] = sum([ self.base_materials[i].params[prop] * self.molar_fraction[i] for i in itrange ])
            except TypeError:
                #if there is a type error, it is probably a string.  Just go with the value of the first base_material.
-               self.params[prop] = self.base_materials[0].params[prop]
-        material.set_state(self, pressure, temperature)
+               params[prop] = self.base_materials[0].params[prop]
+        return params
+
+    def params_at(self, pressure, temperature):
+        return self.static_params()
 
 class helper_spin_transition(material):
     """ 
@@ -263,6 +314,12 @@ class helper_spin_transition(material):
         self.params = mat.params
         material.set_state(self, pressure, temperature)                
 
+    def params_at(self, pressure, temperature):
+        if (pressure >= self.transition_pressure):
+            return self.ls_mat.params_at(pressure, temperature)
+        else:
+            return self.hs_mat.params_at(pressure, temperature)
+
 
 
 
@@ -284,6 +341,34 @@ class helper_fe_dependent(material):
         self.params = self.base_material.params
         material.set_state(self, pressure, temperature)
 
+    def params_at(self, pressure, temperature):
+        iron_number = self.iron_number_with_pt(pressure, temperature)[self.which_index]
+        return self.create_inner_material(iron_number).params_at(pressure, temperature)
+
+    def params_along(self, pressures, temperatures):
+        """
+        Returns the parameters at all given pressures [Pa] and temperatures
+        [K] as a dictionary of arrays, so that the whole profile can be
+        evaluated at once, see :func:`burnman.evaluation.evaluate_pointwise`.
+        iron_number_with_pt is called once with the arrays of pressures and
+        temperatures (as :func:`burnman.calculate_partition_coefficient`
+        allows). Raises NotImplementedError if this is not possible.
+        """
+        pressures = np.asarray(pressures, dtype=float)
+        try:
+            iron_numbers = self.iron_number_with_pt(pressures, np.asarray(temperatures, dtype=float))[self.which_index]
+            iron_numbers = np.broadcast_to(np.asarray(iron_numbers, dtype=float), pressures.shape)
+        except (TypeError, ValueError):
+            raise NotImplementedError("iron_number_with_pt does not accept arrays")
+
+        # one inner material for each distinct iron number
+        (unique, inverse) = np.unique(iron_numbers, return_inverse=True)
+        rows = [self.create_inner_material(iron_number).static_params() for iron_number in unique]
+        if any(params is None for params in rows):
+            raise NotImplementedError("the parameters of the inner material depend on the state")
+        names = [key for (key, value) in rows[0].items() if isinstance(value, (int, long, float, np.number))]
+        return dict((key, np.array([params[key] for params in rows], dtype=float)[inverse]) for key in names)
+
     def iron_number(self):
         return self.iron_number_with_pt(self.pressure, self.temperature)[self.which_index]
     def molar_mass(self):
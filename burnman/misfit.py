@@ -0,0 +1,226 @@
+# BurnMan - a lower mantle toolkit
+# Copyright (C) 2012, 2013, Heister, T., Unterborn, C., Rose, I. and Cottaar, S.
+# Released under GPL v2 or later.
+
+"""
+Misfits between computed and reference profiles for many candidate models
+at once. The computed profiles of n_models models are given as arrays of
+shape (n_models, n_points), one row per model, and all models are scored in
+a single vectorized call. A single profile (an array of length n_points)
+gives a single number, like :func:`burnman.chi_factor` and
+:func:`burnman.l2`.
+
+The observables are named like the results of :func:`burnman.evaluate`:
+'rho', 'v_p', 'v_s' and 'v_phi'.
+"""
+
+import numpy as np
+import scipy.integrate as integrate
+
+import seismic
+
+observables = ['rho', 'v_p', 'v_s', 'v_phi']
+
+
+def chi_factor(calc, obs, uncertainty=None, weights=None):
+    """
+    Chi factor of every profile in calc against obs, the mean squared
+    difference in units of the uncertainty of obs.
+
+    :type calc: array of float
+    :param calc: computed values, of shape (n_models, n_points) or (n_points)
+
+    :type obs: array of float
+    :param obs: reference values, broadcast against calc
+
+    :type uncertainty: float or array of float
+    :param uncertainty: absolute uncertainty of the reference values,
+      broadcast against calc. By default 1% of the mean of every reference
+      profile.
+
+    :type weights: array of float
+    :param weights: weight of every point, broadcast against calc. By
+      default all points have the same weight.
+
+    :returns: chi factor of every model
+    :rtype: array of float of length n_models, or float
+    """
+    calc = np.asarray(calc, dtype=float)
+    obs = np.asarray(obs, dtype=float)
+    if uncertainty is None:
+        uncertainty = 0.01*np.mean(obs, axis=-1)[..., np.newaxis]
+    err = ((calc-obs)/uncertainty)**2
+    if weights is None:
+        return np.sum(err, axis=-1)/err.shape[-1]
+    weights = np.broadcast_to(np.asarray(weights, dtype=float), err.shape)
+    return np.sum(weights*err, axis=-1)/np.sum(weights, axis=-1)
+
+
+def l2(depths, calc, obs, uncertainty=None, weights=None):
+    """
+    L2 norm of the difference of every profile in calc to obs, integrated
+    over depth with the trapezoidal rule (assumed to be linear between
+    points).
+
+    :type depths: array of float
+    :param depths: depths in m, of length n_points
+
+    :type calc: array of float
+    :param calc: computed values, of shape (n_models, n_points) or (n_points)
+
+    :type obs: array of float
+    :param obs: reference values, broadcast against calc
+
+    :type uncertainty: float or array of float
+    :param uncertainty: if given, the differences are divided by this
+      uncertainty of the reference values before they are squared
+
+    :type weights: array of float
+    :param weights: weight of every point, broadcast against calc
+
+    :returns: L2 norm of every model
+    :rtype: array of float of length n_models, or float
+    """
+    diff = np.asarray(calc, dtype=float) - np.asarray(obs, dtype=float)
+    if uncertainty is not None:
+        diff = diff/uncertainty
+    diff = diff*diff
+    if weights is not None:
+        diff = diff*weights
+    return integrate.trapz(diff, depths, axis=-1)
+
+
+def nrmse(calc, obs, weights=None):
+    """
+    Root mean square difference of every profile in calc to obs, normalized
+    by the range of the profile in calc.
+
+    :type calc: array of float
+    :param calc: computed values, of shape (n_models, n_points) or (n_points)
+
+    :type obs: array of float
+    :param obs: reference values, broadcast against calc
+
+    :type weights: array of float
+    :param weights: weight of every point, broadcast against calc
+
+    :returns: normalized root mean square error of every model
+    :rtype: array of float of length n_models, or float
+    """
+    calc = np.asarray(calc, dtype=float)
+    diff = calc - np.asarray(obs, dtype=float)
+    diff = diff*diff
+    if weights is None:
+        mean = np.sum(diff, axis=-1)/diff.shape[-1]
+    else:
+        weights = np.broadcast_to(np.asarray(weights, dtype=float), diff.shape)
+        mean = np.sum(weights*diff, axis=-1)/np.sum(weights, axis=-1)
+    return np.sqrt(mean)/(np.max(calc, axis=-1)-np.min(calc, axis=-1))
+
+
+def misfits(predicted, reference, norm='chi', depths=None, uncertainties=None, weights=None):
+    """
+    Score many candidate models against one or several reference models.
+
+    :type predicted: dictionary
+    :param predicted: computed profiles of shape (n_models, n_points) (or
+      (n_points) for a single model) for some of the observables, for
+      example {'v_s': vs, 'rho': rho}
+
+    :type reference: dictionary or list of dictionaries
+    :param reference: reference profiles of length n_points for (at least)
+      the same observables, for example computed with
+      :func:`burnman.seismic.seismic_data.evaluate_all_at`. A list of
+      dictionaries compares against several reference models at once.
+
+    :type norm: string
+    :param norm: 'chi' (:func:`chi_factor`), 'l2' (:func:`l2`, needs
+      depths) or 'nrmse' (:func:`nrmse`)
+
+    :type depths: array of float
+    :param depths: depths of the points in m, needed by the 'l2' norm
+
+    :type uncertainties: dictionary or list of dictionaries
+    :param uncertainties: absolute uncertainty profiles (of length
+      n_points) of the reference models for some of the observables, one
+      dictionary for all reference models or one per reference model. The
+      default of the norm is used for all other observables. Not supported
+      by the 'nrmse' norm.
+
+    :type weights: array of float
+    :param weights: weight of every point, the same for all observables
+
+    :returns: dictionary with the misfits of every observable in predicted,
+      each of shape (n_references, n_models) if reference is a list and of
+      shape (n_models) otherwise
+    :rtype: dictionary
+    """
+    references = reference if isinstance(reference, list) else [reference]
+    if uncertainties is None or isinstance(uncertainties, dict):
+        uncertainties = [uncertainties or {}]*len(references)
+    if len(uncertainties) != len(references):
+        raise ValueError, "need one dictionary of uncertainties for every reference model"
+    if norm not in ['chi', 'l2', 'nrmse']:
+        raise ValueError, "unknown norm '%s'" % norm
+
+    result = {}
+    for name in predicted:
+        calc = np.asarray(predicted[name], dtype=float)
+        # stack the reference models, so that all of them are compared with all models at once
+        obs = np.array([r[name] for r in references], dtype=float)
+        obs = obs.reshape(obs.shape[:1] + (1,)*(calc.ndim-1) + obs.shape[1:])
+        uncertainty = None
+        if any(name in u for u in uncertainties):
+            if norm == 'nrmse':
+                raise ValueError, "the nrmse norm does not support uncertainties"
+            # reference models without an uncertainty profile use the default of the norm
+            uncertainty = []
+            for (u, o) in zip(uncertainties, obs):
+                if name in u:
+                    uncertainty.append(np.broadcast_to(u[name], o.shape))
+                elif norm == 'chi':
+                    uncertainty.append(np.broadcast_to(0.01*np.mean(o, axis=-1)[..., np.newaxis], o.shape))
+                else:
+                    uncertainty.append(np.ones(o.shape))
+            uncertainty = np.array(uncertainty)
+        if norm == 'chi':
+            values = chi_factor(calc, obs, uncertainty, weights)
+        elif norm == 'l2':
+            values = l2(depths, calc, obs, uncertainty, weights)
+        else:
+            values = nrmse(calc, obs, weights)
+        result[name] = values if isinstance(reference, list) else values[0]
+    return result
+
+
+def compare_to_references(depths, predicted, models=None, norm='chi', uncertainties=None, weights=None):
+    """
+    Score computed profiles against all registered reference models (see
+    :data:`burnman.seismic.reference_models`) in one pass. The reference
+    models are evaluated at the depths once, with
+    :func:`burnman.seismic.evaluate_models`, and all of them are compared
+    with all computed profiles at once, see :func:`misfits`::
+
+        props = burnman.evaluate(rock, pressures, temperatures)
+        (names, result) = burnman.misfit.compare_to_references(depths, props)
+        best = names[np.argmin(result['v_s'])]
+
+    :type depths: array of float
+    :param depths: depths [m] of the computed profiles
+
+    :type predicted: dictionary
+    :param predicted: computed profiles of shape (n_models, n_points) or
+      (n_points) for some of 'rho', 'v_p', 'v_s' and 'v_phi', other entries
+      are ignored
+
+    :type models: dictionary
+    :param models: seismic models by name, by default all reference models
+
+    :returns: the names of the reference models and a dictionary with the
+      misfit matrix of shape (n_references, n_models) (or (n_references) for
+      a single profile) of every observable
+    :rtype: list of strings, dictionary
+    """
+    references = seismic.evaluate_models(depths, models)
+    predicted = dict((name, values) for (name, values) in predicted.items() if name in observables)
+    return references.keys(), misfits(predicted, references.values(), norm, depths, uncertainties, weights)
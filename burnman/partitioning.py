@@ -7,7 +7,6 @@ import numpy
 import scipy.optimize as opt
 import scipy.integrate as integrate
 import math
-import matplotlib.pyplot as pyplot
 
 #own libs:
 import os, sys
@@ -43,6 +42,8 @@ def calculate_phase_percents(inp):
     in mols and also returns the fraction of perovskite versus ferropericlase, 
     assuming all of the silcon goes into the perovskite phase
     and with any remaining Fe or Mg going into the oxide phase.
+    The weight percentages can also be arrays, one entry for each of several
+    bulk compositions, then all returned values are arrays as well.
     Input:
     inp={'Mg': ..., 'Fe': ..., ...} # in weight percent
     Returns:
@@ -53,7 +54,8 @@ def calculate_phase_percents(inp):
     rel_mol_per = {}
     out = {}
     for a in inp:
-        out[names[a]] = weight_pct_to_mol(a,inp[a])
+        amount = inp[a] if numpy.isscalar(inp[a]) else numpy.asarray(inp[a], dtype=float)
+        out[names[a]] = weight_pct_to_mol(a,amount)
 
 
     norm = out['MgO']+out['FeO']
@@ -66,20 +68,39 @@ def calculate_phase_percents(inp):
     
     
     
-def part_coef_calc(inp2,StartP,EndP,deltaP):
-
-    a = [] #partition coefficent of Fe in fp
-    b = [] #partition coefficent of Fe in pv
-    
-    Pressure= []
-    Temperature=[]
-    counter = 0
+def part_coef_calc(inp2,StartP,EndP,deltaP,initial_distribution_coefficient=0.5):
+    """
+    Computes the partitioning of Fe between ferropericlase and perovskite
+    along the geotherm of Brown and Shankland (1981) from StartP to EndP in
+    steps of deltaP (all in GPa) for the bulk composition inp2 (in weight
+    percent, see calculate_phase_percents()). All pressures are computed in a
+    single call. If the weight percentages in inp2 are arrays, the
+    partitioning is computed for every composition, and a and b have the
+    shape (number of compositions, number of pressures).
+    Returns:
+    P [Pa], T [K], a (Fe in fp), b (Fe in pv), frac_mol_pv, frac_mol_mw
+    """
+    phase_per,rel_mol_per = calculate_phase_percents(inp2)
+    if not numpy.isscalar(rel_mol_per['FeO']):
+        # one row for each composition
+        rel_mol_per = dict((name, value[:, numpy.newaxis]) for (name, value) in rel_mol_per.items())
+
+    Pressure = numpy.arange(StartP, EndP+0.5*deltaP, deltaP)*1.e9
+    Temperature = geotherm.brown_shankland(Pressure)
+    a,b = calculate_partition_coefficient(Pressure, Temperature, rel_mol_per, initial_distribution_coefficient)
+    return Pressure, Temperature, a, b, phase_per['pv'], phase_per['fp']
     
     
    
 def calculate_partition_coefficient(pressure, temperature, components, initial_distribution_coefficient):
 
-    """ calculate the partition coefficient given [...] initial_distribution_coefficient is known as Kd_0 """
+    """ calculate the partition coefficient given [...] initial_distribution_coefficient is known as Kd_0
+    pressure, temperature and the molar fractions in components can also be
+    arrays, which are broadcast against each other, for example a profile of
+    pressures and temperatures for a column of bulk compositions. The result
+    can be passed to the Fe dependent minerals, for example
+    :class:`burnman.minerals.SLB_2011.mg_fe_perovskite_pt_dependent`, which
+    then evaluate whole profiles at once. """
 
     frac_mol_FeO = components['FeO']
     frac_mol_SiO2 = components['SiO2']
@@ -88,13 +109,13 @@ def calculate_partition_coefficient(pressure, temperature, components, initial_d
     delV = 2.e-7 #in m^3/mol, average taken from Nakajima et al 2012, JGR
     
 
-    rs = ((25.e9-pressure)*(delV)/(gas_constant*temperature))+math.log(Kd_0) #eq 5 Nakajima et al 2012
+    rs = ((25.e9-pressure)*(delV)/(gas_constant*temperature))+numpy.log(Kd_0) #eq 5 Nakajima et al 2012
 
-    K = math.exp(rs) #The exchange coefficent at P and T
+    K = numpy.exp(rs) #The exchange coefficent at P and T
 
     num_to_sqrt = (-4.*frac_mol_FeO*(K-1.)*K*frac_mol_SiO2)+(pow(1.+(frac_mol_FeO*(K-1))+((K-1.)*frac_mol_SiO2),2.))
 
-    b = (-1. + frac_mol_FeO - (frac_mol_FeO*K)+frac_mol_SiO2 - (frac_mol_SiO2*K) + math.sqrt(num_to_sqrt)) \
+    b = (-1. + frac_mol_FeO - (frac_mol_FeO*K)+frac_mol_SiO2 - (frac_mol_SiO2*K) + numpy.sqrt(num_to_sqrt)) \
          / (2.*frac_mol_SiO2*(1.-K))
 
     a = b /(((1.-b)*K)+b)
@@ -110,7 +131,7 @@ if __name__ == "__main__":
     EndP = 110.0
     deltaP = 1.
 
-    #P,T,a,b,frac_mol_pv,frac_mol_mw    = part_coef_calc(inp2,StartP,EndP,deltaP)
+    P,T,a,b,frac_mol_pv,frac_mol_mw    = part_coef_calc(inp1,StartP,EndP,deltaP)
 
     gt = lambda p: geotherm.brown_shankland(p)
     pressure = StartP
@@ -3,9 +3,9 @@
 # Released under GPL v2 or later.
 
 import numpy as np
+from collections import OrderedDict
+
 import tools
-import matplotlib.pyplot as plt
-import math
 
 class seismic_data:
     """
@@ -52,6 +52,16 @@ class seismic_data:
         raise ValueError, "not implemented"
         return -1
 
+    def QK(self, depth):
+        """ returns the bulk quality factor Q_K for a depth [m] or an array of depths """
+        raise ValueError, "not implemented"
+        return 0
+
+    def QG(self, depth):
+        """ returns the shear quality factor Q_G (Q_mu) for a depth [m] or an array of depths """
+        raise ValueError, "not implemented"
+        return 0
+
 
 class radiustable(seismic_data):
     """ 
@@ -61,7 +71,18 @@ class radiustable(seismic_data):
     Note: all tables need to be sorted by increasing radius.
     Alternatively, you can also overwrite the _lookup function if you
     want to access with something else like depth than radius.
+
+    All functions also accept arrays of depths. evaluate_all_at() computes
+    the interpolation weights only once and uses them for all tables.
+
+    A radius that is listed twice marks a discontinuity, the table is split
+    into continuous layers there. Values are only interpolated within a
+    layer. Exactly at a discontinuity the value of the layer below is
+    returned, set discontinuity_side to 'above' to get the value of the
+    layer above instead.
     """ 
+    discontinuity_side = 'below'
+
     def __init__(self):
         seismic_data.__init__(self)
         self.table_radius = []
@@ -86,125 +107,256 @@ class radiustable(seismic_data):
     def v_phi(self, depth):
         v_s=self.v_s(depth)
         v_p=self.v_p(depth)
-        return math.sqrt(v_p*v_p-4./3.*v_s*v_s)
+        return np.sqrt(v_p*v_p-4./3.*v_s*v_s)
 
     def density(self, depth):
         return self._lookup(depth, self.table_density)        
 
+    def QK(self, depth):
+        if not hasattr(self, 'table_QK'):
+            return seismic_data.QK(self, depth)
+        return self._lookup(depth, self.table_QK)
+
+    def QG(self, depth):
+        if not hasattr(self, 'table_QG'):
+            return seismic_data.QG(self, depth)
+        return self._lookup(depth, self.table_QG)
+
+    def evaluate_all_at(self, depth_list):
+        """ returns pressure[Pa], density[kg/m^3], Vp[m/s], Vs[m/s] and Vphi[m/s] for a list of depths[m] """
+        lookup = self.__class__._lookup
+        if getattr(lookup, '__func__', lookup) is not radiustable._lookup.__func__:
+            return seismic_data.evaluate_all_at(self, depth_list) # the derived class looks up values differently
+        return self._evaluate_all_with(self._interpolation_weights(np.asarray(depth_list, dtype=float)))
+
+    def _evaluate_all_with(self, weights):
+        """ evaluate_all_at() for the result of _interpolation_weights() """
+        v_p = self._interpolate(weights, self.table_vp)
+        v_s = self._interpolate(weights, self.table_vs)
+        return self._interpolate(weights, self.table_pressure), self._interpolate(weights, self.table_density), \
+            v_p, v_s, np.sqrt(v_p*v_p-4./3.*v_s*v_s)
+
     def depth(self, pressure):
-        radius = tools.lookup_and_interpolate(self.table_pressure[::-1], self.table_radius[::-1], pressure)
-        return self.earth_radius - radius
+        """ returns the depth [m] for a pressure [Pa] or an array of pressures """
+        (table_pressure, table_radius) = self._depth_inverse()
+        return self.earth_radius - tools.interpolate(tools.interpolation_weights(table_pressure, pressure), table_radius)
+
+    def _depth_inverse(self):
+        """
+        Returns the pressures of the table in increasing order and the
+        matching radii. They are computed once and kept until the pressure
+        or radius table is replaced.
+        """
+        inverse = self.__dict__.get('_inverse')
+        if inverse is None or inverse[0] is not self.table_pressure or inverse[1] is not self.table_radius:
+            table_pressure = np.ascontiguousarray(np.asarray(self.table_pressure)[::-1])
+            table_radius = np.ascontiguousarray(np.asarray(self.table_radius)[::-1])
+            inverse = (self.table_pressure, self.table_radius, table_pressure, table_radius)
+            self._inverse = inverse
+        return inverse[2], inverse[3]
+
+    def discontinuities(self):
+        """ returns the depths [m] of the discontinuities of the model, from top to bottom """
+        (first, last, tops) = self._layers()
+        return (self.earth_radius - tops)[::-1]
+
+    def _layers(self):
+        """
+        Returns the first and last row of every continuous layer of the
+        table and the radii of the discontinuities between them. They are
+        computed once and kept until the radius table is replaced.
+        """
+        layers = self.__dict__.get('_layer_index')
+        if layers is None or layers[0] is not self.table_radius:
+            table_radius = np.asarray(self.table_radius)
+            split = np.nonzero(table_radius[1:] == table_radius[:-1])[0]
+            first = np.concatenate(([0], split+1))
+            last = np.concatenate((split, [len(table_radius)-1]))
+            layers = (self.table_radius, first, last, table_radius[split])
+            self._layer_index = layers
+        return layers[1:]
 
     def _lookup(self, depth, value_table):
-        radius = self.earth_radius - depth
-        return tools.lookup_and_interpolate(self.table_radius, value_table, radius)    
-    
+        return self._interpolate(self._interpolation_weights(depth), value_table)
+
+    def _interpolation_weights(self, depth):
+        """
+        Returns the indices of the table rows below and above each depth
+        and the weight of the row above for linear interpolation in radius,
+        like :func:`burnman.tools.interpolation_weights`. The layer of each
+        depth is found first, and only rows of this layer are used. A layer
+        of a single row has this row as lower and upper row.
+        """
+        (first, last, tops) = self._layers()
+        table_radius = np.asarray(self.table_radius)
+        radius = self.earth_radius - np.asarray(depth, dtype=float)
+        layer = np.searchsorted(tops, radius, side='left' if self.discontinuity_side == 'below' else 'right')
+        single = first[layer] == last[layer]
+        upper = np.searchsorted(table_radius, radius, side='left')
+        upper = np.minimum(np.maximum(upper, first[layer]+1), last[layer])
+        lower = np.where(single, upper, upper - 1)
+        inside = (radius > table_radius[0]) & (radius <= table_radius[-1]) & ~single
+        spacing = np.where(single, 1., table_radius[upper] - table_radius[lower])
+        alpha = np.where(inside, (radius - table_radius[lower]) / spacing, 0.)
+        lower = np.where(inside | (radius <= table_radius[0]), lower, upper)
+        return lower, upper, alpha
+
+    def _interpolate(self, weights, value_table):
+        return tools.interpolate(weights, value_table)
+
+
+class uniform_radiustable(radiustable):
+    """
+    Copy of a radiustable resampled on a uniform grid of radii, so that the
+    table row for a depth can be computed directly instead of being searched
+    for. This is faster when the same model is evaluated very often, for
+    example for misfits inside an inversion. Note that discontinuities of the
+    original model are smoothed out over one grid spacing::
 
-class prem(radiustable):
-    """ 
-    reads in the table for PREM (input_seismic/prem_table.txt) using the base class radiustable
+        fast_prem = burnman.seismic.uniform_radiustable(burnman.seismic.prem(), 1.e3)
     """
+    def __init__(self, model, spacing):
+        """
+        Resample the tables of the radiustable model every spacing [m].
+        """
+        radiustable.__init__(self)
+        self.earth_radius = model.earth_radius
+        min_radius = np.min(model.table_radius)
+        n_points = int(np.ceil((np.max(model.table_radius) - min_radius) / spacing)) + 1
+        self.table_radius = min_radius + spacing*np.arange(n_points)
+        weights = model._interpolation_weights(self.earth_radius - self.table_radius)
+        self.table_pressure = model._interpolate(weights, model.table_pressure)
+        self.table_density = model._interpolate(weights, model.table_density)
+        self.table_vp = model._interpolate(weights, model.table_vp)
+        self.table_vs = model._interpolate(weights, model.table_vs)
+        self.spacing = spacing
+
+    def _interpolation_weights(self, depth):
+        position = (self.earth_radius - np.asarray(depth, dtype=float) - self.table_radius[0]) / self.spacing
+        position = np.clip(position, 0., len(self.table_radius)-1)
+        lower = np.minimum(np.floor(position).astype(int), len(self.table_radius)-2)
+        return lower, lower+1, position-lower
+
+
+class table_model(radiustable):
+    """
+    A radiustable that is read from text tables. Derived classes only declare
+    the file and which column contains which quantity, for example::
+
+        class ak135(table_model):
+            filename = "input_seismic/ak135_lowermantle.txt"
+            columns = {'radius': 0, 'pressure': 1, 'density': 2, 'vp': 3, 'vs': 4, 'QK': 5, 'QG': 6}
+
+    Every column is stored as table_<name> (table_radius, table_pressure,
+    ...), radius, pressure, density, vp and vs are required. A column can
+    also be taken from another table by giving (filename, column) instead
+    of the column number. These tables need to have the depth in the first
+    column and have to be sampled at the same depths as filename; filename
+    is cut to their depth range (see :class:`slow`). Columns that are not in
+    SI units are multiplied by the factors in units. Tables sorted by
+    decreasing radius are reversed. The parsed tables are cached, see
+    :func:`burnman.tools.cached_table`.
+    """
+    filename = None
+    columns = {'radius': 0, 'pressure': 1, 'density': 2, 'vp': 3, 'vs': 4}
+    units = {}
+
     def __init__(self):
         radiustable.__init__(self)
-        table = tools.read_table("input_seismic/prem_table.txt") # radius, pressure, density, v_p, v_s
-        table = np.array(table)
-        self.table_radius = table[:,0]
-        self.table_pressure = table[:,1] 
-        self.table_density = table[:,2]
-        self.table_vp = table[:,3]
-        self.table_vs = table[:,4]
+        table = self._increasing_radius(tools.cached_table(self.filename), self.columns['radius'], 1.)
+
+        # cut the table to the depth range of the tables the other columns are taken from
+        for column in self.columns.values():
+            if isinstance(column, tuple):
+                other = self._increasing_radius(tools.cached_table(column[0]), 0, -1.)
+                min_radius = self.earth_radius-max(other[:,0])
+                max_radius = self.earth_radius-min(other[:,0])
+                radius = table[:,self.columns['radius']]
+                table = table[(radius>=min_radius) & (radius<=max_radius)]
+                assert(len(table) == len(other))
+
+        for (name, column) in self.columns.items():
+            if isinstance(column, tuple):
+                values = self._increasing_radius(tools.cached_table(column[0]), 0, -1.)[:,column[1]]
+            else:
+                values = table[:,column]
+            if name in self.units:
+                values = values * self.units[name]
+            setattr(self, 'table_' + name, values)
+
+    def _increasing_radius(self, table, column, direction):
+        if direction*table[0,column] > direction*table[-1,column]:
+            return table[::-1]
+        return table
+
+
+class prem(table_model):
+    """ 
+    reads in the table for PREM (input_seismic/prem_table.txt) using the base class radiustable
+    """
+    filename = "input_seismic/prem_table.txt" # radius, pressure, density, v_p, v_s
 
     def grav(self,depths):
-        table = tools.read_table("input_seismic/grav_for_PREM.txt") # radius, g
-        table = np.array(table)
+        table = tools.cached_table("input_seismic/grav_for_PREM.txt") # radius, g
         table_rad = table[:,0]
         table_g = table[:,1]
         return np.interp(self.earth_radius-depths, table_rad,table_g)
 
 
-class slow(radiustable):
+class slow(table_model):
     """ 
     Inserts the mean profiles for slower regions in the lower mantle (Lekic et al. 2012). 
     We need to stitch together three tables. Note that prem_lowermantle has a wider range, 
     so we cut away rows at the top and bottom. Interpolation is not necessary, 
     because all tables where generated with at the same depths 
     """
-    def __init__(self):
-        radiustable.__init__(self)
-
-        table = tools.read_table("input_seismic/prem_lowermantle.txt")#data is: radius pressure density V_p V_s Q_K Q_G
-        table = np.array(table)
-        table[:,0] = table[:,0]  
-        table2 = tools.read_table("input_seismic/swave_slow.txt")
-        table2 = np.array(table2)
-        table3 = tools.read_table("input_seismic/pwave_slow.txt")
-        table3 = np.array(table3)
-
-        min_radius = self.earth_radius-max(table2[:,0])
-        max_radius = self.earth_radius-min(table2[:,0])
-        
-        table=np.array(filter(lambda x: (x[0]>=min_radius and x[0]<=max_radius), table))
-
-        assert(len(table) == len(table2))
-        assert(len(table) == len(table3))
-
-        self.table_radius = table[:,0]
-        self.table_pressure = table[:,1] 
-        self.table_density = table[:,2]
-        self.table_vp = table3[:,1] 
-        self.table_vs = table2[:,1] 
+    filename = "input_seismic/prem_lowermantle.txt" #data is: radius pressure density V_p V_s Q_K Q_G
+    columns = {'radius': 0, 'pressure': 1, 'density': 2,
+               'vp': ("input_seismic/pwave_slow.txt", 1), 'vs': ("input_seismic/swave_slow.txt", 1)}
        
 
-class fast(radiustable):
+class fast(table_model):
     """ 
     Inserts the mean profiles for faster regions in the lower mantle (Lekic et al. 2012). 
     We need to stitch together three tables. Note that prem_lowermantle has a wider range, 
     so we cut away rows at the top and bottom. Interpolation is not necessary, 
     because all tables where generated with at the same depths 
     """
-    def __init__(self):
-        radiustable.__init__(self)
-
-        table = tools.read_table("input_seismic/prem_lowermantle.txt")#data is: radius pressure density V_p V_s Q_K Q_G
-        table = np.array(table)
-        table[:,0] = table[:,0]  
-        table2 = tools.read_table("input_seismic/swave_fast.txt")
-        table2 = np.array(table2)
-        table3 = tools.read_table("input_seismic/pwave_fast.txt")
-        table3 = np.array(table3)
+    filename = "input_seismic/prem_lowermantle.txt" #data is: radius pressure density V_p V_s Q_K Q_G
+    columns = {'radius': 0, 'pressure': 1, 'density': 2,
+               'vp': ("input_seismic/pwave_fast.txt", 1), 'vs': ("input_seismic/swave_fast.txt", 1)}
 
-        min_radius = self.earth_radius-max(table2[:,0])
-        max_radius = self.earth_radius-min(table2[:,0])
-        
-        table=np.array(filter(lambda x: (x[0]>=min_radius and x[0]<=max_radius), table))
 
-        assert(len(table) == len(table2))
-        assert(len(table) == len(table3))
 
-        self.table_radius = table[:,0]
-        self.table_pressure = table[:,1] 
-        self.table_density = table[:,2]
-        self.table_vp = table3[:,1] 
-        self.table_vs = table2[:,1] 
+# this uses prem_lowermantle table
+class prem_test(table_model):
+    filename = "input_seismic/prem_lowermantle.txt" #data is: radius pressure density V_p V_s Q_K Q_G
+    columns = {'radius': 0, 'pressure': 1, 'density': 2, 'vp': 3, 'vs': 4, 'QK': 5, 'QG': 6}
 
 
+class prem_withQ(table_model):
+    """
+    PREM in the lower mantle (Dziewonski & Anderson 1981), including the
+    quality factors QK and QG (input_seismic/prem_withQ.txt)
+    """
+    filename = "input_seismic/prem_withQ.txt" # radius, pressure [GPa], density, v_p, v_s, Q_K, Q_G
+    columns = {'radius': 0, 'pressure': 1, 'density': 2, 'vp': 3, 'vs': 4, 'QK': 5, 'QG': 6}
+    units = {'pressure': 1.e9}
 
-# this uses prem_lowermantle table
-class prem_test(radiustable):
-    def __init__(self):
-        radiustable.__init__(self)
 
-        table = tools.read_table("input_seismic/prem_lowermantle.txt")#data is: radius pressure density V_p V_s Q_K Q_G
-        table = np.array(table)
-        self.table_radius = table[:,0]   
-        self.table_pressure = table[:,1] 
-        self.table_density = table[:,2]
-        self.table_vp = table[:,3] 
-        self.table_vs = table[:,4] 
+class ak135(table_model):
+    """
+    AK135 in the lower mantle (Kennett et al. 1995), including the quality
+    factors QK and QG (input_seismic/ak135_lowermantle.txt)
+    """
+    filename = "input_seismic/ak135_lowermantle.txt" # radius, pressure, density, v_p, v_s, Q_K, Q_G
+    columns = {'radius': 0, 'pressure': 1, 'density': 2, 'vp': 3, 'vs': 4, 'QK': 5, 'QG': 6}
 
 def attenuation_correction(v_p,v_s,v_phi,Qs,Qphi):
     """ 
     Applies the attenuation correction following Matas et al. (2007), page 4. This is a minor effect on the velocities 
+    All arguments can also be arrays, for example Qs and Qphi along a
+    profile from the QG and QK columns of a seismic model.
     """
     beta = 0.3 # Matas et al. (2007) page 4
     Qp  = 3./4.*pow((v_p/v_s),2.)*Qs    # Matas et al. (2007) page 4
@@ -216,11 +368,266 @@ def attenuation_correction(v_p,v_s,v_phi,Qs,Qphi):
     v_phi= v_phi*(1.-1./2.*cot*1./Qphi)
     return v_p, v_s, v_phi
     
+class lazy_model:
+    """
+    Stands in for a seismic model that is only created (and its tables
+    read) when it is used for the first time. All attributes are looked up
+    in the model.
+    """
+    def __init__(self, model_class):
+        self.__dict__['model_class'] = model_class
+        self.__dict__['model'] = None
+
+    def __getattr__(self, name):
+        return getattr(self.instance(), name)
+
+    def instance(self):
+        """ returns the model, it is created if necessary """
+        if self.model is None:
+            self.__dict__['model'] = self.model_class()
+        return self.model
+
 # shared variable of prem, so that other routines do not need to create
 # prem over and over. See geotherm for example.
-prem_model = prem()
+prem_model = lazy_model(prem)
+
+# the reference models that computed profiles are compared against by
+# evaluate_models() and burnman.misfit.compare_to_references(), more
+# models can be added to this dictionary
+reference_models = OrderedDict([('prem', prem_model), ('slow', lazy_model(slow)),
+                                ('fast', lazy_model(fast)), ('ak135', lazy_model(ak135))])
+
+
+def evaluate_models(depths, models=None):
+    """
+    Evaluates several seismic models at the same depths. Models that are
+    sampled at the same radii (like slow and fast) share the lookup of the
+    table rows and interpolation weights for the depths.
+
+    :type depths: array of float
+    :param depths: depths [m]
+
+    :type models: dictionary
+    :param models: seismic models by name, by default reference_models
+
+    :returns: dictionary with one dictionary per model with the arrays
+      'pressure' [Pa], 'rho' [kg/m^3], 'v_p', 'v_s' and 'v_phi' [m/s], in the
+      order of models
+    :rtype: OrderedDict
+    """
+    if models is None:
+        models = reference_models
+    depths = np.asarray(depths, dtype=float)
+    shared_weights = {}
+    result = OrderedDict()
+    for (name, model) in models.items():
+        if isinstance(model, lazy_model):
+            model = model.instance()
+        lookup = getattr(model.__class__, '_lookup', None)
+        if isinstance(model, radiustable) and getattr(lookup, '__func__', lookup) is radiustable._lookup.__func__:
+            key = (getattr(model._interpolation_weights, '__func__', None), model.earth_radius,
+                   model.discontinuity_side, np.asarray(model.table_radius, dtype=float).tostring())
+            if key not in shared_weights:
+                shared_weights[key] = model._interpolation_weights(depths)
+            values = model._evaluate_all_with(shared_weights[key])
+        else:
+            values = model.evaluate_all_at(depths)
+        result[name] = dict(zip(['pressure', 'rho', 'v_p', 'v_s', 'v_phi'], values))
+    return result
+
+
+class tomography_model(seismic_data):
+    """
+    Laterally varying seismic model, given as relative perturbations dv/v of
+    v_s and v_p with respect to a 1D reference model on a grid of latitudes
+    [deg], longitudes [deg] and depths [m]. Each perturbation is an array of
+    shape (n_latitudes, n_longitudes, n_depths), usually stored in a .npy
+    file that is memory-mapped, so that only the parts in use are read::
+
+        np.save("dvs.npy", dvs)
+        model = burnman.seismic.tomography_model(latitudes, longitudes, depths, "dvs.npy")
+        v_s = model.v_s_at(lat, lon, depth)
+        misfit = model.misfit(predicted_v_s)
+
+    All functions work through the model or the points in chunks of
+    chunk_size values, so neither has to fit into memory at once. The 1D
+    functions of seismic_data (pressure(), v_s(), ...) return the
+    reference model.
+    """
+    chunk_size = 1000000
+
+    def __init__(self, latitudes, longitudes, depths, dvs, dvp=None, reference=prem_model):
+        """
+        The grid coordinates are arrays in increasing order. dvs and dvp are
+        the perturbations, either arrays or names of .npy files. reference
+        is the 1D seismic model that is perturbed.
+        """
+        seismic_data.__init__(self)
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.depths = np.asarray(depths, dtype=float)
+        # a grid that covers all longitudes wraps around from the last to the
+        # first longitude
+        self.periodic = len(self.longitudes) > 1 and \
+            2.*self.longitudes[-1] - self.longitudes[-2] - self.longitudes[0] >= 360. - 1.e-8
+        self.reference = reference
+        self.perturbations = {}
+        for (name, values) in [('v_s', dvs), ('v_p', dvp)]:
+            if values is None:
+                continue
+            if isinstance(values, basestring):
+                values = np.load(values, mmap_mode='r')
+            assert(values.shape == (len(self.latitudes), len(self.longitudes), len(self.depths)))
+            self.perturbations[name] = values
+
+    def internal_depth_list(self):
+        return self.depths
+
+    def pressure(self, depth):
+        return self.reference.pressure(depth)
+
+    def density(self, depth):
+        return self.reference.density(depth)
+
+    def v_p(self, depth):
+        return self.reference.v_p(depth)
+
+    def v_s(self, depth):
+        return self.reference.v_s(depth)
+
+    def v_phi(self, depth):
+        return self.reference.v_phi(depth)
+
+    def depth(self, pressure):
+        return self.reference.depth(pressure)
+
+    def QK(self, depth):
+        return self.reference.QK(depth)
+
+    def QG(self, depth):
+        return self.reference.QG(depth)
+
+    def v_s_at(self, latitudes, longitudes, depths):
+        """ returns v_s [m/s] at the points given by latitude [deg], longitude [deg] and depth [m] """
+        return self._evaluate_at('v_s', latitudes, longitudes, depths)
+
+    def v_p_at(self, latitudes, longitudes, depths):
+        """ returns v_p [m/s] at the points given by latitude [deg], longitude [deg] and depth [m] """
+        return self._evaluate_at('v_p', latitudes, longitudes, depths)
+
+    def _evaluate_at(self, name, latitudes, longitudes, depths):
+        """
+        Trilinear interpolation of the perturbation between the grid nodes.
+        Longitudes are mapped into the range of the grid. On a grid that
+        covers all longitudes, points between the last and the first
+        longitude are interpolated across the seam, on a regional grid they
+        are rejected. Points above or below the grid in latitude or depth get
+        the value of the closest node.
+        """
+        (latitudes, longitudes, depths) = np.broadcast_arrays(np.asarray(latitudes, dtype=float),
+                                                              np.asarray(longitudes, dtype=float),
+                                                              np.asarray(depths, dtype=float))
+        perturbation = self.perturbations[name]
+        result = np.empty(latitudes.shape)
+        flat_result = result.reshape(-1)
+        (latitudes, longitudes, depths) = (latitudes.ravel(), longitudes.ravel(), depths.ravel())
+
+        for start in range(0, len(flat_result), self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            weights = [tools.interpolation_weights(self.latitudes, latitudes[chunk]),
+                       self._longitude_weights(longitudes[chunk]),
+                       tools.interpolation_weights(self.depths, depths[chunk])]
+            values = 0.
+            for corner in range(8):
+                factor = 1.
+                indices = []
+                for (axis, (lower, upper, alpha)) in enumerate(weights):
+                    if corner & (1 << axis):
+                        factor = factor * alpha
+                        indices.append(upper)
+                    else:
+                        factor = factor * (1. - alpha)
+                        indices.append(lower)
+                values = values + factor * perturbation[indices[0], indices[1], indices[2]]
+            reference = getattr(self.reference, name)(depths[chunk])
+            flat_result[chunk] = reference * (1. + values)
+        return result
+
+    def _longitude_weights(self, longitudes):
+        """
+        Like :func:`burnman.tools.interpolation_weights` for the longitudes
+        of the grid, taking into account that longitudes are periodic.
+        """
+        first = self.longitudes[0]
+        last = self.longitudes[-1]
+        longitudes = first + np.mod(longitudes - first, 360.)
+        (lower, upper, alpha) = tools.interpolation_weights(self.longitudes, longitudes)
+        beyond = longitudes > last
+        if np.any(beyond):
+            if not self.periodic:
+                raise ValueError, "longitude outside of the grid of the tomography model"
+            # between the last longitude and the first one plus 360 degrees
+            lower = np.where(beyond, len(self.longitudes)-1, lower)
+            upper = np.where(beyond, 0, upper)
+            alpha = np.where(beyond, (longitudes - last) / (first + 360. - last), alpha)
+        return lower, upper, alpha
+
+    def _slabs(self, name):
+        """
+        Iterates over blocks of latitudes, yields the slice of latitudes and
+        the velocities on the grid nodes of this block.
+        """
+        perturbation = self.perturbations[name]
+        reference = getattr(self.reference, name)(self.depths)
+        n_latitudes = max(1, self.chunk_size // (len(self.longitudes) * len(self.depths)))
+        for start in range(0, len(self.latitudes), n_latitudes):
+            block = slice(start, start + n_latitudes)
+            yield block, reference * (1. + np.asarray(perturbation[block], dtype=float))
+
+    def misfit(self, predicted, name='v_s'):
+        """
+        Returns the root mean square difference between the model and a
+        prediction on all grid nodes. Nodes are weighted by the cosine of
+        their latitude, the area they represent on a regular grid.
+
+        :type predicted: array of float
+        :param predicted: predicted velocities [m/s] at the depths of the
+          grid, or an array of the same shape as the model.
+
+        :param string name: 'v_s' or 'v_p'
+        """
+        predicted = np.asarray(predicted, dtype=float)
+        squares = 0.
+        total_weight = 0.
+        for (block, values) in self._slabs(name):
+            weight = np.cos(np.radians(self.latitudes[block]))[:, np.newaxis, np.newaxis]
+            if predicted.ndim == 3:
+                difference = values - predicted[block]
+            else:
+                difference = values - predicted
+            squares += np.sum(weight * difference * difference)
+            total_weight += np.sum(weight) * len(self.longitudes) * len(self.depths)
+        return np.sqrt(squares / total_weight)
+
+    def residuals(self, predicted, filename, name='v_s'):
+        """
+        Writes the difference between the model and a prediction (see
+        :func:`misfit`) on all grid nodes into a new .npy file, one block at
+        a time, and returns it memory-mapped.
+        """
+        predicted = np.asarray(predicted, dtype=float)
+        result = np.lib.format.open_memmap(filename, mode='w+', dtype=float, \
+                                           shape=(len(self.latitudes), len(self.longitudes), len(self.depths)))
+        for (block, values) in self._slabs(name):
+            if predicted.ndim == 3:
+                result[block] = values - predicted[block]
+            else:
+                result[block] = values - predicted
+        result.flush()
+        return result
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
     #create a seismic dataset from prem:
     s=prem()
     depths = s.internal_depth_list()
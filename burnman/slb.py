@@ -8,8 +8,6 @@ import debye
 import numpy as np
 from equation_of_state import equation_of_state
 import warnings
- 
-import matplotlib.pyplot as plt
 
 class slb_base(equation_of_state):
     """
@@ -55,25 +53,35 @@ class slb_base(equation_of_state):
         return eta_s
 
 
-    def volume(self, pressure, temperature, params):
+    # search interval [V/V_0] for the volume, see volume()
+    volume_bracket = (0.6, 1.2)
+
+    def pressure(self, temperature, volume, params):
         """
-        Returns molar volume at the pressure and temperature [m^3]
+        Returns pressure [Pa] as a function of temperature [K] and volume [m^3]
+        EQ 21
         """
-        debye_T = lambda x : self.__debye_temperature(params['V_0']/x, params)
-        gr = lambda x : self.grueneisen_parameter(pressure, temperature, x, params)
-        E_th =  lambda x : debye.thermal_energy(temperature, debye_T(x), params['n']) #thermal energy at temperature T
-        E_th_ref = lambda x : debye.thermal_energy(300., debye_T(x), params['n']) #thermal energy at reference temperature
-      
+        debye_T = self.__debye_temperature(params['V_0']/volume, params)
+        gr = self.grueneisen_parameter(0., temperature, volume, params)
+        E_th = debye.thermal_energy(temperature, debye_T, params['n']) #thermal energy at temperature T
+        E_th_ref = debye.thermal_energy(300., debye_T, params['n']) #thermal energy at reference temperature
+
         b_iikk= 9.*params['K_0'] # EQ 28
         b_iikkmm= 27.*params['K_0']*(params['Kprime_0']-4.) # EQ 29
-        f = lambda x: 0.5*(pow(params['V_0']/x,2./3.)-1.) # EQ 24
-        func = lambda x: (1./3.)*(pow(1.+2.*f(x),5./2.))*((b_iikk*f(x)) \
-            +(0.5*b_iikkmm*pow(f(x),2.))) + gr(x)*(E_th(x) - E_th_ref(x))/x - pressure #EQ 21 
+        f = 0.5*(pow(params['V_0']/volume,2./3.)-1.) # EQ 24
+        return (1./3.)*(pow(1.+2.*f,5./2.))*((b_iikk*f) \
+            +(0.5*b_iikkmm*pow(f,2.))) + gr*(E_th - E_th_ref)/volume #EQ 21
+
+    def volume(self, pressure, temperature, params):
+        """
+        Returns molar volume at the pressure and temperature [m^3]
+        """
+        func = lambda x: self.pressure(temperature, x, params) - pressure
 
         # we need to have a sign change in [a,b] to find a zero. Let us start with a
         # conservative guess:
-        a = 0.6*params['V_0']
-        b = 1.2*params['V_0']
+        a = self.volume_bracket[0]*params['V_0']
+        b = self.volume_bracket[1]*params['V_0']
 
         # if we have a sign change, we are done:
         if func(a)*func(b)<0:
@@ -175,6 +183,13 @@ class slb_base(equation_of_state):
         K = self.isothermal_bulk_modulus(pressure, temperature, volume, params)
         alpha = gr * C_v / K / volume
         return alpha
+
+    def entropy(self, pressure, temperature, volume, params):
+        """
+        Returns the vibrational entropy at the pressure, temperature, and volume [J/K/mol]
+        """
+        debye_T = self.__debye_temperature(params['V_0']/volume, params)
+        return debye.entropy(temperature, debye_T, params['n'])
     
     
     
@@ -4,7 +4,10 @@
 
 import operator
 import bisect
+import itertools
 import os
+import tempfile
+import numpy as np
 
 def pretty_print_table(table,use_tabs=False):
     """
@@ -45,27 +48,169 @@ def float_eq(a,b):
 def linear_interpol(x, x1, x2, y1, y2):
     """
     Linearly interpolate to point x, between
-    the points (x1,y1), (x2,y2)
+    the points (x1,y1), (x2,y2). All arguments can also be arrays.
     """
-    assert(x1<=x)
-    assert(x2>=x)
-    assert(x1<=x2)
+    assert(np.all(x1<=x))
+    assert(np.all(x2>=x))
+    assert(np.all(x1<=x2))
 
     alpha = (x - x1) / (x2-x1)
     return (1.-alpha)*y1 + alpha*y2
 
-def open_burnman_file(filename):
+def burnman_file_path(filename):
+    """
+    Returns the full path of filename, relative to the burnman directory,
+    without opening the file.
+    """
     path = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
-    fullname = os.path.join(path,filename)
-    return open(fullname)
+    return os.path.join(path,filename)
 
-def read_table(filename):
-    table=[]
-    
-    for line in open_burnman_file(filename).readlines():
-        if (line[0]!='#'):
-            numbers = map(float, line.split())
-            table.append(numbers)
+def open_burnman_file(filename):
+    return open(burnman_file_path(filename))
+
+def read_table(filename, header_rows=0, chunk_rows=100000, sidecar=True):
+    """
+    Reads the whitespace separated table in filename (relative to the
+    burnman directory) and returns it as a contiguous 2d array of floats.
+    Lines starting with # and empty lines are skipped, as well as the first
+    header_rows of the remaining lines (for example a line with the names of
+    the columns). The file is parsed in chunks of chunk_rows lines, see
+    read_table_chunks().
+
+    If sidecar is True and a binary copy of the table, filename + '.npy'
+    (see write_table_sidecar()), exists and is not older than the text
+    file, this copy is mapped into memory instead, and the returned array
+    is read-only.
+    """
+    if sidecar:
+        fullname = burnman_file_path(filename)
+        binary_name = fullname + '.npy'
+        if os.path.exists(binary_name) and os.stat(binary_name).st_mtime >= os.stat(fullname).st_mtime:
+            return np.load(binary_name, mmap_mode='r').view(np.ndarray)
+    chunks = list(read_table_chunks(filename, header_rows, chunk_rows))
+    if len(chunks) == 1:
+        return chunks[0]
+    if len(chunks) == 0:
+        return np.empty((0, 0))
+    return np.concatenate(chunks)
+
+def read_table_chunks(filename, header_rows=0, chunk_rows=100000):
+    """
+    Reads the table in filename like read_table(), but returns the rows in
+    chunks of (at most) chunk_rows rows, so that large tables can be
+    processed without holding all of them in memory::
+
+        for chunk in burnman.tools.read_table_chunks("input_seismic/prem_table.txt"):
+            print chunk.shape
+    """
+    columns = None
+    with open_burnman_file(filename) as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                break
+            rows = lines
+            text = ''.join(lines)
+            if header_rows > 0 or columns is None or '#' in text:
+                (rows, header_rows) = _data_rows(lines, header_rows)
+                if not rows:
+                    continue
+                if columns is None:
+                    columns = len(rows[0].split())
+                text = '\n'.join(rows)
+            values = np.fromstring(text, dtype=float, sep=' ')
+            if len(values) != len(rows)*columns and rows is lines:
+                # there are empty lines
+                rows = _data_rows(lines, 0)[0]
+                values = np.fromstring('\n'.join(rows), dtype=float, sep=' ')
+            if len(values) != len(rows)*columns:
+                raise ValueError, "%s: all rows need to have %d numbers" % (filename, columns)
+            yield values.reshape(len(rows), columns)
+
+def _data_rows(lines, header_rows):
+    """
+    Returns the lines that are neither empty nor comments, without the
+    first header_rows of them, and the number of header rows that are left.
+    """
+    rows = []
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped[0] == '#':
+            continue
+        if header_rows > 0:
+            header_rows -= 1
+            continue
+        rows.append(stripped)
+    return rows, header_rows
+
+def write_table_sidecar(filename, header_rows=0):
+    """
+    Stores the table in filename (relative to the burnman directory) as a
+    binary copy next to it, filename + '.npy', which read_table() maps into
+    memory instead of parsing the text. This is worthwhile for large
+    tables that are read often. The copy is ignored once the text file is
+    changed.
+    """
+    table = read_table(filename, header_rows, sidecar=False)
+    np.save(burnman_file_path(filename) + '.npy', table)
+
+# Directory for binary copies of the tables read by cached_table(), so that
+# other processes do not need to parse them again, for example
+# ~/.cache/burnman. The tables are loaded from there without checking who
+# wrote them, so it must only be writable by the user. By default (None)
+# the tables are only kept in memory, set $BURNMAN_TABLE_CACHE to enable
+# the binary copies.
+table_cache_directory = os.environ.get('BURNMAN_TABLE_CACHE') or None
+_cached_tables = {}
+
+def cached_table(filename):
+    """
+    Returns the table in filename (relative to the burnman directory, like
+    read_table()) as a read-only 2d array. The file is only parsed once:
+    the result is kept in memory and, if table_cache_directory is set,
+    stored as a .npy file there, which other processes map into memory
+    instead of parsing the text again. Both copies are renewed when the
+    modification time of the file changes, and older binary copies of the
+    file are removed. All callers share the same array, so it must not be
+    modified.
+    """
+    fullname = burnman_file_path(filename)
+    stat = os.stat(fullname)
+    key = (stat.st_mtime, stat.st_size)
+    cached = _cached_tables.get(fullname)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    table = None
+    binary_name = None
+    if table_cache_directory is not None:
+        prefix = "%s-%x-" % (os.path.basename(fullname), hash(fullname) & 0xffffffff)
+        binary_name = os.path.join(table_cache_directory, prefix + "%r-%d.npy" % key)
+        try:
+            table = np.load(binary_name, mmap_mode='r').view(np.ndarray)
+        except (IOError, OSError, ValueError):
+            pass
+    if table is None:
+        table = read_table(filename)
+        # no need for another binary copy if read_table() found one
+        if binary_name is not None and table.flags.writeable:
+            try:
+                if not os.path.isdir(table_cache_directory):
+                    os.makedirs(table_cache_directory)
+                # write to a temporary file first, so that other processes
+                # never see a partially written table
+                (handle, temporary_name) = tempfile.mkstemp(dir=table_cache_directory)
+                with os.fdopen(handle, 'wb') as f:
+                    np.save(f, table)
+                os.rename(temporary_name, binary_name)
+                for name in os.listdir(table_cache_directory):
+                    if name.startswith(prefix) and name != os.path.basename(binary_name):
+                        os.remove(os.path.join(table_cache_directory, name))
+            except (IOError, OSError):
+                pass
+        table.flags.writeable = False
+
+    _cached_tables[fullname] = (key, table)
     return table
 
 def cut_table(table, min_value, max_value):
@@ -74,7 +219,26 @@ def cut_table(table, min_value, max_value):
         tablen.append(table[i,:])
     return tablen
 
-def lookup_and_interpolate(table_x, table_y, x_value):    
+def lookup_and_interpolate(table_x, table_y, x_value, weights=None):
+    """
+    Linearly interpolates table_y (given at the increasing values of
+    table_x) at x_value. Outside of table_x the first or last value of
+    table_y is returned. x_value can also be an array, which is looked up
+    in table_x with np.searchsorted, see interpolation_weights(). If
+    several tables share table_x, the rows can be searched for once and
+    passed as weights::
+
+        weights = burnman.tools.interpolation_weights(table_x, x_values)
+        y1 = burnman.tools.lookup_and_interpolate(table_x, table_y1, x_values, weights)
+        y2 = burnman.tools.lookup_and_interpolate(table_x, table_y2, x_values, weights)
+
+    table_y can also be a 2d array with one column for each quantity.
+    """
+    if weights is not None or not np.isscalar(x_value):
+        if weights is None:
+            weights = interpolation_weights(table_x, x_value)
+        return interpolate(weights, table_y)
+
     idx = bisect.bisect_left(table_x, x_value) - 1
     if (idx < 0):
         return table_y[0]
@@ -84,6 +248,37 @@ def lookup_and_interpolate(table_x, table_y, x_value):
     else:
         return table_y[idx]
 
+def interpolation_weights(table_x, x_values):
+    """
+    Returns the indices of the rows of table_x below and above each of
+    x_values and the weight of the row above for linear interpolation. The
+    result can be passed to interpolate() for every table that shares
+    table_x, so the rows are only searched for once. table_x has to be
+    sorted in increasing order. Outside of table_x the first or last row is
+    used, so the values are the same as with lookup_and_interpolate().
+    """
+    table_x = np.asarray(table_x)
+    x_values = np.asarray(x_values, dtype=float)
+    upper = np.searchsorted(table_x, x_values, side='left')
+    inside = (upper > 0) & (upper < len(table_x))
+    upper = np.clip(upper, 1, len(table_x)-1)
+    lower = upper - 1
+    alpha = np.where(inside, (x_values - table_x[lower]) / (table_x[upper] - table_x[lower]), 0.)
+    lower = np.where(inside | (x_values <= table_x[0]), lower, upper)
+    return lower, upper, alpha
+
+def interpolate(weights, table_y):
+    """
+    Linearly interpolate table_y with the weights returned by
+    interpolation_weights(). table_y can also be a 2d array with one column
+    for each quantity, then each column is interpolated.
+    """
+    (lower, upper, alpha) = weights
+    table_y = np.asarray(table_y)
+    if table_y.ndim > 1:
+        alpha = np.asarray(alpha)[..., np.newaxis]
+    return (1.-alpha)*table_y[lower] + alpha*table_y[upper]
+
 def molar_volume_from_unit_cell_volume(unit_cell_v, z):
     """
     takes unit cell volume in Angstroms^3, as is often reported, 
@@ -74,8 +74,9 @@ if __name__ == "__main__":
     #Here we compute the self-consistent pressures
     pressures=burnman.pressures_for_rock(rock,depths,T0)
     # Here is the step which does the heavy lifting.  burnman.velocities_from_rock
-    # sets the state of the rock at each of the pressures and temperatures defined,
-    # then calculates the elastic moduli and density of each individual phase.  After that,
+    # calculates the elastic moduli and density of each individual phase at each of
+    # the pressures and temperatures defined (all at once where possible, so it does
+    # not leave the rock in any particular state).  After that,
     # it performs elastic averaging on the phases to get a single bulk and shear
     # modulus for the rock.  This averaging scheme defaults to Voigt-Reuss-Hilli,
     # but see example_averaging.py for other options.  Finally, it calculates the seismic
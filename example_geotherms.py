@@ -55,8 +55,8 @@ if __name__ == "__main__":
     table_pressure = np.array(table)[:,0]
     table_temperature = np.array(table)[:,1]
     
-    my_geotherm_interpolate = lambda p:  [ burnman.tools.lookup_and_interpolate\
-                (table_pressure, table_temperature, x) for x in p]
+    my_geotherm_interpolate = lambda p: burnman.tools.lookup_and_interpolate\
+                (table_pressure, table_temperature, p)
     temperature5 = my_geotherm_interpolate(pressures)
 
 
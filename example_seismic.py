@@ -105,21 +105,15 @@ if __name__ == "__main__":
     plt.show()
 
     # Loading an a seismic model from a file. In this case AK135 (Kennett et al. 1995).
-    # Note that file input is assumed to be in SI units
+    # This is how burnman.seismic.ak135 is defined: table_model only needs to know
+    # the file and which column contains which quantity.
+    # Note that file input is assumed to be in SI units, otherwise set units.
     plt.close()
-    # Load data table
 
-    class ak135_table(burnman.seismic.radiustable):
-        def __init__(self):
-            burnman.seismic.radiustable.__init__(self)
-            # In format: radius, pressure, density, v_p, v_s
-            table = burnman.tools.read_table("input_seismic/ak135_lowermantle.txt") 
-            table = np.array(table)
-            self.table_radius = table[:,0]
-            self.table_pressure = table[:,1]
-            self.table_density = table[:,2]
-            self.table_vp = table[:,3]
-            self.table_vs = table[:,4]
+    class ak135_table(burnman.seismic.table_model):
+        # In format: radius, pressure, density, v_p, v_s
+        filename = "input_seismic/ak135_lowermantle.txt"
+        columns = {'radius': 0, 'pressure': 1, 'density': 2, 'vp': 3, 'vs': 4}
 
  
     ak=ak135_table() 
@@ -0,0 +1,46 @@
+# BurnMan - a lower mantle toolkit
+# Copyright (C) 2012, 2013, Heister, T., Unterborn, C., Rose, I. and Cottaar, S.
+# Released under GPL v2 or later.
+
+"""
+Measures how long "import burnman" takes in a fresh Python process and fails
+if this exceeds a budget or if importing burnman loads plotting libraries,
+mineral libraries or seismic tables that are only needed later.
+
+usage: python misc/benchmark_import.py [budget in seconds] [repetitions]
+"""
+
+import os, sys, subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+measure = """
+import sys, time
+sys.path.insert(1, %r)
+start = time.time()
+import burnman
+duration = time.time() - start
+loaded = [m for m in ['matplotlib', 'matplotlib.pyplot', 'burnman.minerals.SLB_2011'] if sys.modules.get(m)]
+if burnman.seismic.prem_model.__dict__['model'] is not None:
+    loaded.append('burnman.seismic.prem_model')
+print duration, ','.join(loaded)
+""" % root
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 0.25
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    durations = []
+    for i in range(repetitions):
+        output = subprocess.check_output([sys.executable, '-c', measure]).split()
+        durations.append(float(output[0]))
+        if len(output) > 1:
+            print "import burnman loaded %s" % output[1]
+            sys.exit(1)
+
+    best = min(durations)
+    print "import burnman: best %.3f s, median %.3f s of %d runs (budget %.3f s)" \
+        % (best, sorted(durations)[len(durations)/2], repetitions, budget)
+    if best > budget:
+        print "import burnman is slower than the budget!"
+        sys.exit(1)
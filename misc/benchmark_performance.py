@@ -0,0 +1,235 @@
+# BurnMan - a lower mantle toolkit
+# Copyright (C) 2012, 2013, Heister, T., Unterborn, C., Rose, I. and Cottaar, S.
+# Released under GPL v2 or later.
+
+"""
+Times the parts of BurnMan that most calculations spend their time in and
+compares the timings with a stored baseline:
+
+  - set_state() of a single mineral for every equation of state
+  - velocities_from_rock() for 10^2 up to 10^6 points
+  - geotherm.adiabatic() and pressures_for_rock()
+  - solid solution and spin transition minerals
+  - the averaging schemes
+  - import burnman (see benchmark_import.py)
+
+Every case is run several times and the fastest run is kept. The timings
+are written to a JSON file (by default benchmark_performance.json next to
+the baseline) and compared with the stored baseline,
+misc/benchmark_performance_baseline.json. Every case that takes more than
+threshold times as long as in the baseline is reported and the script
+fails. The script also fails if there is no baseline, run it with --store
+to save the timings of this machine as the new baseline.
+
+usage: python misc/benchmark_performance.py [--store] [--baseline file]
+       [--output file] [--threshold factor] [--max-points n]
+"""
+
+import os, sys, json, time, platform, subprocess, argparse
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(1, root)
+
+import numpy as np
+import burnman
+from burnman import minerals
+from burnman import evaluation
+import benchmark_import
+
+# differences below this many seconds are not reported as regressions, they
+# are within the noise of the timer
+min_difference = 1.e-3
+
+
+def best_time(function, setup=None, repetitions=3, budget=1., max_repetitions=50):
+    """
+    Returns the fastest run of function() in seconds. function() is run at
+    least repetitions times and then again until budget seconds have passed
+    (but at most max_repetitions times), so that short cases are sampled
+    often enough to see through the noise of the machine. setup() is called
+    before every run and is not timed.
+    """
+    durations = []
+    start_all = time.time()
+    while len(durations) < max_repetitions:
+        if setup is not None:
+            setup()
+        start = time.time()
+        function()
+        durations.append(time.time() - start)
+        if len(durations) >= repetitions and time.time() - start_all > budget:
+            break
+    return min(durations)
+
+
+def fresh(rock):
+    """ returns a setup function that forgets all results computed for rock """
+    def setup():
+        evaluation.clear_shared_results()
+        rock.profile_cache = evaluation.profile_cache()
+    return setup
+
+
+def pyrolite(method='slb3'):
+    rock = burnman.composite( [ (minerals.SLB_2011.mg_perovskite(), 0.8),
+                                (minerals.SLB_2011.periclase(), 0.2) ] )
+    rock.set_method(method)
+    return rock
+
+
+def profile(n_points):
+    pressures = np.linspace(25.e9, 130.e9, n_points)
+    return pressures, burnman.geotherm.brown_shankland(pressures)
+
+
+def time_set_state(timings):
+    (pressures, temperatures) = profile(100)
+    for method in ['bm2', 'bm3', 'mgd2', 'mgd3', 'slb2', 'slb3']:
+        mineral = minerals.SLB_2011.mg_perovskite()
+        mineral.set_method(method)
+        def run():
+            for (P, T) in zip(pressures, temperatures):
+                mineral.set_state(P, T)
+        timings['set_state %s (100 states)' % method] = best_time(run)
+
+    for (name, mineral) in [('solid solution', minerals.SLB_2011.ferropericlase(0.2)),
+                            ('spin transition', minerals.Murakami_etal_2012.fe_periclase())]:
+        mineral.set_method('slb3')
+        def run():
+            for (P, T) in zip(pressures, temperatures):
+                mineral.set_state(P, T)
+        timings['set_state %s (100 states)' % name] = best_time(run)
+
+
+def time_velocities(timings, max_points):
+    rock = pyrolite()
+    n_points = 100
+    while n_points <= max_points:
+        (pressures, temperatures) = profile(n_points)
+        timings['velocities_from_rock (%d points)' % n_points] = \
+            best_time(lambda: burnman.velocities_from_rock(rock, pressures, temperatures), fresh(rock))
+        n_points *= 10
+
+    (pressures, temperatures) = profile(1000)
+    for (name, rock) in [('solid solution', burnman.composite( [ (minerals.SLB_2011.mg_fe_perovskite(0.1), 0.8),
+                                                                 (minerals.SLB_2011.ferropericlase(0.2), 0.2) ] )),
+                         ('spin transition', burnman.composite( [ (minerals.SLB_2011.mg_perovskite(), 0.8),
+                                                                  (minerals.Murakami_etal_2012.fe_periclase(), 0.2) ] ))]:
+        rock.set_method('slb3')
+        timings['velocities_from_rock %s (1000 points)' % name] = \
+            best_time(lambda: burnman.velocities_from_rock(rock, pressures, temperatures), fresh(rock))
+
+
+def time_geotherms(timings):
+    rock = pyrolite()
+    (pressures, temperatures) = profile(50)
+    timings['geotherm.adiabatic (50 points)'] = \
+        best_time(lambda: burnman.geotherm.adiabatic(pressures, 1900., rock), fresh(rock))
+    timings['geotherm.adiabatic with new adiabat_cache (50 points)'] = \
+        best_time(lambda: burnman.geotherm.adiabatic(pressures, 1900., rock, burnman.geotherm.adiabat_cache()),
+                  fresh(rock))
+    # the cache is filled by the first call, the timed calls only look up
+    # the temperatures
+    cache = burnman.geotherm.adiabat_cache()
+    burnman.geotherm.adiabatic(pressures, 1900., rock, cache)
+    timings['geotherm.adiabatic with filled adiabat_cache (50 points)'] = \
+        best_time(lambda: burnman.geotherm.adiabatic(pressures, 1900., rock, cache), fresh(rock))
+    depths = np.linspace(700.e3, 2800.e3, 50)
+    timings['pressures_for_rock (50 points)'] = \
+        best_time(lambda: burnman.pressures_for_rock(rock, depths, 1900.), fresh(rock))
+
+
+def time_averaging(timings):
+    n_points = 100000
+    (pressures, temperatures) = profile(n_points)
+    rock = burnman.composite( [ (minerals.SLB_2011.mg_perovskite(), 0.5),
+                                (minerals.SLB_2011.periclase(), 0.3),
+                                (minerals.SLB_2011.stishovite(), 0.2) ] )
+    rock.set_method('slb3')
+    (fractions, phases) = rock.static_unroll()
+    props = evaluation.evaluate_phases(phases, pressures, temperatures)
+    (V, rho, K, G) = [np.array([p[name] for p in props]) for name in ['V', 'rho', 'K_S', 'G']]
+    for name in ['voigt', 'reuss', 'voigt_reuss_hill', 'hashin_shtrikman_upper',
+                 'hashin_shtrikman_lower', 'hashin_shtrikman_average']:
+        scheme = getattr(burnman.averaging_schemes, name)()
+        timings['averaging %s (%d points)' % (name, n_points)] = \
+            best_time(lambda: evaluation.average_phases(fractions, V, rho, K, G, scheme))
+
+
+def time_import(timings):
+    durations = []
+    for i in range(5):
+        output = subprocess.check_output([sys.executable, '-c', benchmark_import.measure]).split()
+        durations.append(float(output[0]))
+    timings['import burnman'] = min(durations)
+
+
+def compare(timings, baseline, threshold):
+    """
+    Prints the timings next to the baseline and returns the names of the
+    cases that got slower than threshold times the baseline.
+    """
+    table = [['case', 'baseline [s]', 'now [s]', 'ratio']]
+    regressions = []
+    for name in sorted(timings):
+        if name not in baseline:
+            table.append([name, '-', '%.4f' % timings[name], '-'])
+            continue
+        ratio = timings[name] / baseline[name]
+        table.append([name, '%.4f' % baseline[name], '%.4f' % timings[name], '%.2f' % ratio])
+        if ratio > threshold and timings[name] - baseline[name] > min_difference:
+            regressions.append(name)
+    burnman.tools.pretty_print_table(table)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time BurnMan and compare with a stored baseline.")
+    parser.add_argument('--baseline', default=os.path.join(root, 'misc', 'benchmark_performance_baseline.json'),
+                        help="baseline timings to compare with")
+    parser.add_argument('--output', default=None,
+                        help="file for the timings, by default benchmark_performance.json next to the baseline")
+    parser.add_argument('--store', action='store_true',
+                        help="store the timings as the new baseline instead of comparing")
+    parser.add_argument('--threshold', type=float, default=1.3,
+                        help="report cases slower than this factor times the baseline")
+    parser.add_argument('--max-points', type=float, default=1.e6,
+                        help="largest number of points for velocities_from_rock")
+    args = parser.parse_args()
+    output_name = args.output
+    if output_name is None:
+        output_name = os.path.join(os.path.dirname(os.path.abspath(args.baseline)), 'benchmark_performance.json')
+    if not args.store and not os.path.exists(args.baseline):
+        print "no baseline found in %s, run with --store to create it" % args.baseline
+        sys.exit(1)
+
+    timings = {}
+    time_set_state(timings)
+    time_velocities(timings, int(args.max_points))
+    time_geotherms(timings)
+    time_averaging(timings)
+    time_import(timings)
+
+    results = {'python': platform.python_version(), 'numpy': np.__version__,
+               'machine': platform.machine(), 'timings': timings}
+    with open(output_name, 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+
+    if args.store:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        burnman.tools.pretty_print_table([['case', 'now [s]']] + \
+                                             [[name, '%.4f' % timings[name]] for name in sorted(timings)])
+        print "stored these timings as the baseline in %s" % args.baseline
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['python'] != results['python'] or baseline['numpy'] != results['numpy']:
+        print "note: the baseline was measured with python %s and numpy %s" % (baseline['python'], baseline['numpy'])
+    regressions = compare(timings, baseline['timings'], threshold=args.threshold)
+    if regressions:
+        print "slower than %.2f times the baseline:" % args.threshold
+        for name in regressions:
+            print "  " + name
+        sys.exit(1)
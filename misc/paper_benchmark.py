@@ -41,7 +41,7 @@ def check_slb_fig7_txt():
                     'eta_s_0' : 2.364}
     forsterite.set_method('slb3')
 
-    data = np.loadtxt("slb_benchmark.txt", skiprows=1)
+    data = burnman.tools.read_table("misc/slb_benchmark.txt", header_rows=1)
  
     temperature = np.array(data[:,2])
     pressure = np.array(data[:,0])
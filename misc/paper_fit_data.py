@@ -59,7 +59,7 @@ def error(guess, test_mineral, pressures, obs_vs):
     return l2_error
 
 
-mg_perovskite_data = np.loadtxt("Murakami_perovskite.txt")
+mg_perovskite_data = burnman.tools.read_table("misc/Murakami_perovskite.txt")
 obs_pressures = mg_perovskite_data[:,0]*1.e9
 obs_vs = mg_perovskite_data[:,2]*1000.
 
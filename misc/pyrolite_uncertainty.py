@@ -497,56 +497,65 @@ if whattodo=="run":
   outfile.write("#pressure\t Vs \t Vp \t rho \n")
   best_fit_file = open('output_pyrolite_closest_fit.txt', 'w') 
 
-  for i in range(n_realizations):
-    if (i>0 and i%25==0):
+  batch_size = 25
+  for first in range(0, n_realizations, batch_size):
+    if first>0:
         # save good fits
         print "saving %d fits to %s"%(len(goodfits),dbname)
         pickle.dump(goodfits, open(dbname+".tmp", "wb"))
         os.rename(dbname+".tmp", dbname)
         pickle.dump(names, open(dbname+".names", "wb"))
 
-    print "realization", i+1
+    #create the models of this batch and integrate all their adiabats at once
+    realizations = [realize_pyrolite() for i in range(first, min(first+batch_size, n_realizations))]
     try:
-      #create the ith model
-      pyrolite, anchor_temperature= realize_pyrolite()
-      temperature = burnman.geotherm.adiabatic(pressure, anchor_temperature, pyrolite)
+      temperatures = burnman.geotherm.adiabats(pressure, [t for (r,t) in realizations], [r for (r,t) in realizations])
+    except ValueError:
+      # integrate one by one below, so that only the failing models are skipped
+      temperatures = [None for r in realizations]
+
+    for (i, (pyrolite, anchor_temperature), temperature) in zip(range(first, n_realizations), realizations, temperatures):
+      print "realization", i+1
+      try:
+        if temperature is None:
+          temperature = burnman.geotherm.adiabatic(pressure, anchor_temperature, pyrolite)
      
-      #calculate the seismic observables
-      rho, vp, vs, vphi, K, G = \
-        burnman.velocities_from_rock(pyrolite, pressure, temperature, burnman.averaging_schemes.hashin_shtrikman_average())
-
-      #estimate the misfit with the seismic model 
-      err_rho, err_vphi, err_vs = burnman.compare_l2(depths/np.mean(depths), vs/np.mean(seis_vs), vphi/np.mean(seis_vphi), \
-        rho/np.mean(seis_rho), seis_vs/np.mean(seis_vs), seis_vphi/np.mean(seis_vphi), seis_rho/np.mean(seis_rho))
-      error = np.sum([err_rho, err_vphi, err_vs])
-      if error < min_error:
-        min_error = error
-        print error
-        best_fit_file.write('Current best fit : '+str(error) + '\n' )
-        output_rock(pyrolite, best_fit_file)
+        #calculate the seismic observables
+        rho, vp, vs, vphi, K, G = \
+          burnman.velocities_from_rock(pyrolite, pressure, temperature, burnman.averaging_schemes.hashin_shtrikman_average())
+
+        #estimate the misfit with the seismic model 
+        err_rho, err_vphi, err_vs = burnman.compare_l2(depths/np.mean(depths), vs/np.mean(seis_vs), vphi/np.mean(seis_vphi), \
+          rho/np.mean(seis_rho), seis_vs/np.mean(seis_vs), seis_vphi/np.mean(seis_vphi), seis_rho/np.mean(seis_rho))
+        error = np.sum([err_rho, err_vphi, err_vs])
+        if error < min_error:
+          min_error = error
+          print error
+          best_fit_file.write('Current best fit : '+str(error) + '\n' )
+          output_rock(pyrolite, best_fit_file)
       
-      a,names = realization_to_array(pyrolite, anchor_temperature)
-      a.extend([error, err_rho, err_vphi, err_vs])
-      names.extend(["err","err_rho","err_vphi","err_vs"])
-      goodfits.append(a)
+        a,names = realization_to_array(pyrolite, anchor_temperature)
+        a.extend([error, err_rho, err_vphi, err_vs])
+        names.extend(["err","err_rho","err_vphi","err_vs"])
+        goodfits.append(a)
 
-      #interpolate to a higher resolution line
-      frho = interpolate.interp1d(pressure, rho) 
-      fs = interpolate.interp1d(pressure, vs) 
-      fphi = interpolate.interp1d(pressure, vphi) 
+        #interpolate to a higher resolution line
+        frho = interpolate.interp1d(pressure, rho) 
+        fs = interpolate.interp1d(pressure, vs) 
+        fphi = interpolate.interp1d(pressure, vphi) 
 
-      pressure_list = pressures_sampled
-      density_list = frho(pressures_sampled)
-      vs_list = fs(pressures_sampled)
-      vphi_list = fphi(pressures_sampled)
+        pressure_list = pressures_sampled
+        density_list = frho(pressures_sampled)
+        vs_list = fs(pressures_sampled)
+        vphi_list = fphi(pressures_sampled)
 
       
 
-      data=zip(pressure_list, vs_list, vphi_list, density_list)
-      np.savetxt(outfile,data,fmt='%.10e',delimiter='\t')
+        data=zip(pressure_list, vs_list, vphi_list, density_list)
+        np.savetxt(outfile,data,fmt='%.10e',delimiter='\t')
 
-    except ValueError:
-      print "failed, skipping"
+      except ValueError:
+        print "failed, skipping"
       
   outfile.close()
   best_fit_file.close()
@@ -75,19 +75,7 @@ if __name__ == "__main__":
 
     
     # seismic velocities for comparison
-    class ak135_table(burnman.seismic.radiustable):
-        def __init__(self):
-            burnman.seismic.radiustable.__init__(self) 
-            table = burnman.tools.read_table("input_seismic/ak135_lowermantle.txt") # radius, pressure, density, v_p, v_s
-            table = np.array(table)
-            self.table_radius = table[:,0]
-            self.table_pressure = table[:,1]
-            self.table_density = table[:,2]
-            self.table_vp = table[:,3]
-            self.table_vs = table[:,4]
-
-
-    ak=ak135_table()
+    ak=burnman.seismic.ak135()
     #seismic model for comparison:
     depths = map(ak.depth, seis_p_1)
     seis_p, seis_rho, seis_vp, seis_vs, seis_vphi = ak.evaluate_all_at(depths)
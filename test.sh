@@ -24,6 +24,9 @@ cd ..
 
 python burnman/partitioning.py || exit 1
 
+echo "*** import time..."
+python misc/benchmark_import.py || exit 1
+
 cd misc
 echo "gen_doc..."
 python gen_doc.py >/dev/null || exit 1
@@ -98,5 +98,11 @@ class composite(unittest.TestCase):
         self.assertArraysAlmostEqual(f,[0.4,0.6])
         self.assertEqual(mins,",".join([min1.to_string(),min2.to_string()]))
 
+    def test_import_all_libraries(self):
+        namespace = {}
+        exec "from burnman.minerals import *" in namespace
+        names = sorted(name for name in namespace if name != '__builtins__')
+        self.assertEqual(names, sorted(minerals.libraries))
+
 if __name__ == '__main__':
     unittest.main()
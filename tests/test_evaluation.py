@@ -0,0 +1,183 @@
+import unittest
+import os, sys
+sys.path.insert(1,os.path.abspath('..'))
+
+import numpy as np
+import burnman
+from burnman import minerals
+from burnman import evaluation
+
+
+class stacked_evaluation(unittest.TestCase):
+    def assertPropertiesAlmostEqual(self, a, b):
+        for name in evaluation.property_names:
+            for (i1,i2) in zip(a[name],b[name]):
+                self.assertTrue(abs(i1-i2) <= 1.e-6*abs(i2))
+
+    def test_same_as_pointwise(self):
+        pressures = np.linspace(30.e9, 120.e9, 5)
+        temperatures = np.linspace(1800., 2500., 5)
+        for method in ['slb3', 'mgd2', 'bm3']:
+            rock = burnman.composite( [ (minerals.SLB_2011.mg_fe_perovskite(0.1), 0.7),
+                                        (minerals.SLB_2011.periclase(), 0.2),
+                                        (minerals.Murakami_etal_2012.fe_periclase(), 0.1) ] )
+            rock.set_method(method)
+            (fractions, mins) = rock.static_unroll()
+            stacked = evaluation.evaluate_phases(mins, pressures, temperatures)
+            for (props, mineral) in zip(stacked, mins):
+                self.assertPropertiesAlmostEqual(props, evaluation.evaluate_pointwise(mineral, pressures, temperatures))
+
+    def test_groups(self):
+        pressures = np.linspace(30.e9, 120.e9, 5)
+        temperatures = np.linspace(1800., 2500., 5)
+        mins = [minerals.SLB_2011.mg_perovskite(), minerals.SLB_2011.periclase(), minerals.SLB_2011.stishovite()]
+        for mineral in mins:
+            mineral.set_method('slb3')
+        mins[2].set_method('bm3')
+        groups = evaluation.group_minerals(mins)
+        self.assertEqual([indices for (method, params, indices) in groups], [[0, 1], [2]])
+        (method, params, indices) = groups[0]
+        props = evaluation.evaluate_group(method, params, pressures[np.newaxis, :], temperatures[np.newaxis, :])
+        self.assertEqual(props['V'].shape, (2, 5))
+
+        # without vectorized equation of state each state is solved on its own
+        class pointwise(method.__class__):
+            def vectorized_volume(self, pressure, temperature, params):
+                raise NotImplementedError("")
+        fallback = evaluation.evaluate_group(pointwise(), params, pressures[np.newaxis, :], temperatures[np.newaxis, :])
+        for row in range(2):
+            self.assertPropertiesAlmostEqual(dict((name, fallback[name][row]) for name in evaluation.property_names),
+                                             dict((name, props[name][row]) for name in evaluation.property_names))
+        volumes = evaluation.evaluate_group(pointwise(), params, pressures[np.newaxis, :], temperatures[:2, np.newaxis],
+                                            volume_only=True)
+        self.assertEqual(sorted(volumes.keys()), ['V', 'rho'])
+        self.assertAlmostEqual(volumes['V'][1, 3] / mins[1].method.volume(pressures[3], temperatures[1], mins[1].params), 1., 10)
+
+    def test_without_molar_mass(self):
+        mineral = burnman.material()
+        mineral.params = dict(minerals.SLB_2011.periclase().params)
+        del mineral.params['molar_mass']
+        mineral.set_method('slb3')
+        mineral.set_state(1.e5, 300.)
+        self.assertAlmostEqual(mineral.molar_volume() / mineral.params['V_0'], 1., 3)
+        props = evaluation.evaluate_pointwise(mineral, np.array([30.e9]), np.array([2000.]))
+        self.assertTrue(np.isnan(props['rho'][0]))
+        self.assertTrue(props['V'][0] > 0.)
+
+    def test_shared_results(self):
+        pressures = np.linspace(30.e9, 120.e9, 5)
+        temperatures = np.linspace(1800., 2500., 5)
+        rock1 = burnman.composite( [ (minerals.SLB_2011.periclase(), 0.5), (minerals.SLB_2011.periclase(), 0.5) ] )
+        rock2 = burnman.composite( [ (minerals.SLB_2011.mg_perovskite(), 0.5), (minerals.SLB_2011.periclase(), 0.5) ] )
+        rock1.set_method('slb3')
+        rock2.set_method('slb3')
+        props1 = evaluation.evaluate_phases(rock1.static_unroll()[1], pressures, temperatures)
+        props2 = evaluation.evaluate_phases(rock2.static_unroll()[1], pressures, temperatures)
+        self.assertTrue(props1[0] is props1[1])
+        self.assertTrue(props1[0] is props2[1])
+        self.assertFalse(props1[0]['V'].flags.writeable)
+
+        rock2.staticphases[1].mineral.params['K_0'] = 170.e9
+        props3 = evaluation.evaluate_phases(rock2.static_unroll()[1], pressures, temperatures)
+        self.assertTrue(props3[0] is props2[0])
+        self.assertFalse(props3[1] is props2[1])
+
+    def test_profile_cache(self):
+        pressures = np.linspace(30.e9, 120.e9, 5)
+        temperatures = np.linspace(1800., 2500., 5)
+        rock = burnman.composite( [ (minerals.SLB_2011.mg_perovskite(), 0.5), (minerals.SLB_2011.periclase(), 0.5) ] )
+        rock.set_method('slb3')
+        burnman.velocities_from_rock(rock, pressures, temperatures)
+        self.assertEqual(len(rock.profile_cache.changed), 2)
+        burnman.velocities_from_rock(rock, pressures, temperatures)
+        self.assertEqual(len(rock.profile_cache.changed), 0)
+
+        periclase = rock.staticphases[1].mineral
+        periclase.params['K_0'] = 165.e9
+        burnman.velocities_from_rock(rock, pressures, temperatures)
+        self.assertEqual(rock.profile_cache.changed, [periclase])
+
+        burnman.velocities_from_rock(rock, pressures[:3], temperatures[:3])
+        self.assertEqual(len(rock.profile_cache.changed), 2)
+
+    def test_static_params(self):
+        self.assertEqual(minerals.Murakami_etal_2012.fe_periclase().static_params(), None)
+        fp = minerals.SLB_2011.ferropericlase(0.5)
+        self.assertAlmostEqual(fp.static_params()['V_0'], 0.5*(11.24e-6+12.26e-6))
+
+    def test_dynamic_composite(self):
+        class mycomposite(burnman.composite_base):
+            def unroll(self):
+                return ([1.0],[minerals.SLB_2011.periclase()])
+        self.assertEqual(mycomposite().static_unroll(), None)
+        self.assertEqual(burnman.composite( [ (mycomposite(), 1.0) ] ).static_unroll(), None)
+
+
+class functional_evaluation(unittest.TestCase):
+    def assertArraysAlmostEqual(self, a, b):
+        for (i1,i2) in zip(a,b):
+            self.assertTrue(abs(i1-i2) <= 1.e-6*abs(i2))
+
+    def check_rock(self, rock):
+        pressures = np.linspace(30.e9, 120.e9, 5)
+        temperatures = np.linspace(1800., 2500., 5)
+        props = burnman.evaluate(rock, pressures, temperatures)
+        (rho, vp, vs, vphi, K, G) = burnman.velocities_from_rock(rock, pressures, temperatures)
+        self.assertArraysAlmostEqual(props['rho'], rho)
+        self.assertArraysAlmostEqual(props['v_p'], vp)
+        self.assertArraysAlmostEqual(props['v_s'], vs)
+        self.assertArraysAlmostEqual(props['v_phi'], vphi)
+        self.assertArraysAlmostEqual(props['K_S'], K)
+        self.assertArraysAlmostEqual(props['G'], G)
+
+    def test_static_rock(self):
+        rock = burnman.composite( [ (minerals.SLB_2011.mg_fe_perovskite(0.1), 0.7),
+                                    (minerals.SLB_2011.periclase(), 0.3) ] )
+        rock.set_method('slb3')
+        self.check_rock(rock)
+
+    def test_state_dependent_rock(self):
+        rock = burnman.composite( [ (minerals.SLB_2011.mg_fe_perovskite(0.1), 0.7),
+                                    (minerals.Murakami_etal_2012.fe_periclase(), 0.3) ] )
+        rock.set_method('slb3')
+        burnman.evaluate(rock, [40.e9, 80.e9], [2000., 2000.])
+        self.assertFalse(hasattr(rock.staticphases[1].mineral, 'pressure'))
+        self.assertFalse(hasattr(rock.staticphases[1].mineral.ls_mat, 'pressure'))
+        self.check_rock(rock)
+
+    def test_dynamic_composite(self):
+        class mycomposite(burnman.composite_base):
+            def __init__(self):
+                self.minerals = [minerals.SLB_2011.periclase(), minerals.SLB_2011.mg_perovskite()]
+                for m in self.minerals:
+                    m.set_method('slb3')
+            def unroll(self):
+                if self.pressure > 60.e9:
+                    return ([0.2, 0.8], self.minerals)
+                return ([0.6, 0.4], self.minerals)
+        rock = mycomposite()
+        rock.set_state(120.e9, 2000.)
+        props = burnman.evaluate(rock, [40.e9, 80.e9], [2000., 2000.])
+        self.assertEqual(rock.pressure, 120.e9)
+        for (idx, fraction) in enumerate([0.6, 0.2]):
+            static_rock = burnman.composite( [ (rock.minerals[0], fraction), (rock.minerals[1], 1.-fraction) ] )
+            static_props = burnman.evaluate(static_rock, [40.e9, 80.e9], [2000., 2000.])
+            self.assertArraysAlmostEqual([props['v_s'][idx]], [static_props['v_s'][idx]])
+
+    def test_densities(self):
+        pressures = np.linspace(30.e9, 120.e9, 5)
+        temperatures = np.array([np.linspace(1800., 2500., 5), np.linspace(2000., 2700., 5)])
+        rock1 = burnman.composite( [ (minerals.SLB_2011.mg_fe_perovskite(0.1), 0.7),
+                                     (minerals.SLB_2011.periclase(), 0.3) ] )
+        rock2 = burnman.composite( [ (minerals.SLB_2011.mg_fe_perovskite(0.1), 0.7),
+                                     (minerals.Murakami_etal_2012.fe_periclase(), 0.3) ] )
+        rock1.set_method('slb3')
+        rock2.set_method('slb3')
+        rho = evaluation.densities([rock1, rock2], pressures, temperatures)
+        self.assertEqual(rho.shape, (2, 5))
+        self.assertArraysAlmostEqual(rho[0], burnman.velocities_from_rock(rock1, pressures, temperatures[0])[0])
+        self.assertArraysAlmostEqual(rho[1], burnman.velocities_from_rock(rock2, pressures, temperatures[1])[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import unittest
+import os, sys
+sys.path.insert(1,os.path.abspath('..'))
+
+import numpy as np
+import burnman
+from burnman import geotherm, tools
+
+
+class geotherms(unittest.TestCase):
+    def test_watson_baxter(self):
+        pressures = np.linspace(0., 140.e9, 57)
+        temperatures = geotherm.watson_baxter(pressures)
+        for (p, T) in zip(pressures, temperatures):
+            if p <= 15.e9:
+                self.assertEqual(T, 1900.-1420.*pow(0.8,p/1.e9))
+            else:
+                self.assertEqual(T, 1680.+11.1*p/1.e9)
+
+    def test_tables(self):
+        pressures = np.linspace(0., 140.e9, 57)
+        for (function, filename) in [(geotherm.brown_shankland, "input_geotherm/brown_81.txt"),
+                                     (geotherm.anderson, "input_geotherm/anderson_82.txt")]:
+            table = np.array(tools.read_table(filename))
+            temperatures = function(pressures)
+            for (p, T) in zip(pressures, temperatures):
+                depth = burnman.seismic.prem_model.depth(p)
+                self.assertEqual(T, tools.lookup_and_interpolate(table[:,0], table[:,1], depth))
+
+
+class adiabats(unittest.TestCase):
+    def setUp(self):
+        self.pressures = np.linspace(30.e9, 120.e9, 4)
+        self.rock = burnman.composite( [ (burnman.minerals.SLB_2011.mg_fe_perovskite(0.1), 0.7),
+                                         (burnman.minerals.SLB_2011.periclase(), 0.3) ] )
+        self.rock.set_method('slb3')
+
+    def assertArraysAlmostEqual(self, a, b, tol):
+        for (i1,i2) in zip(a,b):
+            self.assertTrue(abs(i1-i2) <= tol*abs(i2))
+
+    def test_ensemble(self):
+        temperatures = geotherm.adiabats(self.pressures, [1600., 2200.], self.rock)
+        self.assertEqual(temperatures.shape, (2, 4))
+        for (T0, T) in zip([1600., 2200.], temperatures):
+            reference = geotherm.adiabatic(self.pressures, T0, self.rock)
+            self.assertArraysAlmostEqual(T, reference, 1.e-6)
+        fixed = geotherm.adiabats(self.pressures, [1600., 2200.], self.rock, steps=4)
+        self.assertArraysAlmostEqual(fixed[1], temperatures[1], 1.e-6)
+
+    def test_several_rocks(self):
+        other = burnman.composite( [ (burnman.minerals.SLB_2011.mg_fe_perovskite(0.1), 0.7),
+                                     (burnman.minerals.Murakami_etal_2012.fe_periclase(), 0.3) ] )
+        other.set_method('slb3')
+        temperatures = geotherm.adiabats(self.pressures, [1800., 1900.], [self.rock, other])
+        self.assertArraysAlmostEqual(temperatures[0], geotherm.adiabatic(self.pressures, 1800., self.rock), 1.e-6)
+        # dT/dP jumps at the spin transition, neither integration is as
+        # accurate as for a smooth adiabat there
+        self.assertArraysAlmostEqual(temperatures[1], geotherm.adiabatic(self.pressures, 1900., other), 1.e-5)
+
+    def test_step_guards(self):
+        T = np.array([1900.])
+        gradient = lambda P, T: 1.e-8*T
+        (T1, dT1, h) = geotherm._dormand_prince(gradient, 30.e9, 40.e9, T, gradient(30.e9, T), None, 1.e-8)
+        self.assertTrue(abs(T1[0] - 1900.*np.exp(100.)) <= 1.e-6*T1[0])
+        self.assertRaises(ValueError, geotherm._dormand_prince, gradient, 30.e9, 40.e9, T, gradient(30.e9, T),
+                          None, 1.e-8, max_steps=2)
+        self.assertRaises(ValueError, geotherm._dormand_prince, gradient, 30.e9, 40.e9, T, gradient(30.e9, T),
+                          None, 1.e-8, h_min=1.e9)
+        nan = lambda P, T: np.where(P > 35.e9, np.nan, 1.e-8*T)
+        self.assertRaises(ValueError, geotherm._dormand_prince, nan, 30.e9, 40.e9, T, nan(30.e9, T), None, 1.e-8)
+
+    def test_cache(self):
+        cache = geotherm.adiabat_cache()
+        temperatures = geotherm.adiabatic(self.pressures, 1900., self.rock, cache)
+        self.assertArraysAlmostEqual(temperatures, geotherm.adiabatic(self.pressures, 1900., self.rock), 1.e-6)
+        nodes = cache.adiabats.values()[0]
+
+        # covered by the cached adiabat, no integration needed
+        pressures = np.linspace(30.e9, 100.e9, 9)
+        temperatures = geotherm.adiabatic(pressures, 1900., self.rock, cache)
+        self.assertTrue(cache.adiabats.values()[0][0] is nodes[0])
+        self.assertArraysAlmostEqual(temperatures, geotherm.adiabatic(pressures, 1900., self.rock), 1.e-6)
+
+        # extends the cached adiabat
+        pressures = np.linspace(30.e9, 130.e9, 5)
+        temperatures = geotherm.adiabatic(pressures, 1900., self.rock, cache)
+        self.assertEqual(len(cache.adiabats), 1)
+        self.assertTrue(cache.adiabats.values()[0][0][-1] >= 130.e9)
+        self.assertArraysAlmostEqual(temperatures, geotherm.adiabatic(pressures, 1900., self.rock), 1.e-6)
+
+        # a different anchor is a different adiabat
+        geotherm.adiabatic(pressures, 2000., self.rock, cache)
+        self.assertEqual(len(cache.adiabats), 2)
+
+        other = burnman.composite( [ (burnman.minerals.Murakami_etal_2012.fe_periclase(), 1.0) ] )
+        other.set_method('slb3')
+        self.assertEqual(cache.temperatures(pressures, 1900., other), None)
+
+    def test_entropy(self):
+        # dS/dT = C_v/T at constant volume
+        from burnman import debye
+        for T in [300., 1000., 3000.]:
+            dS = (debye.entropy(T+1.e-2, 800., 5.) - debye.entropy(T-1.e-2, 800., 5.))/2.e-2
+            self.assertAlmostEqual(T*dS/debye.heat_capacity_v(T, 800., 5.), 1., 6)
+        T = np.array([300., 1000., 3000.])
+        self.assertEqual(list(debye.entropy(T, 800., 5.)), [debye.entropy(t, 800., 5.) for t in T])
+
+    def test_isentrope(self):
+        for method in ['slb3', 'mgd3']:
+            self.rock.set_method(method)
+            temperatures = geotherm.isentrope(self.pressures, 1900., self.rock)
+            self.assertAlmostEqual(temperatures[0], 1900., 8)
+            self.assertArraysAlmostEqual(temperatures, geotherm.adiabatic(self.pressures, 1900., self.rock), 1.e-6)
+        self.assertRaises(ValueError, geotherm.isentrope, self.pressures, 1900., self.rock, max_iterations=1)
+
+    def test_isentrope_dynamic(self):
+        class dynamic(burnman.composite_base):
+            def __init__(self, rock):
+                self.rock = rock
+            def unroll(self):
+                return self.rock.unroll()
+        rock = dynamic(self.rock)
+        self.assertTrue(rock.static_unroll() is None)
+        temperatures = geotherm.isentrope(self.pressures, 1900., rock)
+        self.assertArraysAlmostEqual(temperatures, geotherm.isentrope(self.pressures, 1900., self.rock), 1.e-10)
+        self.assertFalse(hasattr(rock, 'pressure'))
+
+
+class profiles(unittest.TestCase):
+    def setUp(self):
+        self.rock = burnman.composite( [ (burnman.minerals.SLB_2011.mg_fe_perovskite(0.1), 0.7),
+                                         (burnman.minerals.SLB_2011.periclase(), 0.3) ] )
+        self.rock.set_method('slb3')
+
+    def test_hydrostatic(self):
+        depths = np.linspace(800.e3, 2600.e3, 61)
+        (pressures, temperatures, gravity) = burnman.profile_for_rock(self.rock, depths, 1900.)
+        # the state of the rock is not changed
+        self.assertFalse(hasattr(self.rock, 'pressure'))
+        self.assertFalse(any(hasattr(mineral, 'pressure') for mineral in self.rock.unroll()[1]))
+        self.assertEqual(pressures[0], burnman.seismic.prem_model.pressure(800.e3))
+        self.assertEqual(list(pressures), list(burnman.pressures_for_rock(self.rock, depths, 1900.)))
+        adiabat = geotherm.adiabatic(pressures, 1900., self.rock)
+        for (T1, T2) in zip(temperatures, adiabat):
+            self.assertTrue(abs(T1-T2) <= 1.e-5*T2)
+        # dP/dz = rho g, up to the error of the trapezoidal rule
+        rho = burnman.velocities_from_rock(self.rock, pressures, temperatures)[0]
+        dP = 0.5*(rho[1:]*gravity[1:] + rho[:-1]*gravity[:-1])*np.diff(depths)
+        for (p1, p2) in zip(pressures[1:], pressures[0] + np.cumsum(dP)):
+            self.assertTrue(abs(p1-p2) <= 1.e-5*p2)
+
+    def test_depths(self):
+        pressures = np.linspace(30.e9, 120.e9, 7)
+        temperatures = np.array([np.linspace(1800., 2500., 7), np.linspace(2000., 2700., 7)])
+        other = burnman.composite( [ (burnman.minerals.SLB_2011.mg_fe_perovskite(0.1), 0.5),
+                                     (burnman.minerals.SLB_2011.periclase(), 0.5) ] )
+        other.set_method('slb3')
+        depths = burnman.depths_for_rock([self.rock, other], pressures, temperatures)
+        self.assertEqual(depths.shape, (2, 7))
+        self.assertEqual(list(depths[0]), list(burnman.depths_for_rock(self.rock, pressures, temperatures[0])))
+        self.assertEqual(list(depths[1]), list(burnman.depths_for_rock(other, pressures, temperatures[1])))
+        self.assertEqual(burnman.depths_for_rock(self.rock, pressures, temperatures).shape, (2, 7))
+
+    def test_self_consistent_gravity(self):
+        depths = np.linspace(800.e3, 2600.e3, 5)
+        (pressures, temperatures, gravity) = burnman.profile_for_rock(self.rock, depths, 1900., self_consistent_gravity=True)
+        self.assertAlmostEqual(gravity[0], burnman.seismic.prem_model.grav(800.e3), 10)
+        for (p1, p2) in zip(pressures, burnman.pressures_for_rock(self.rock, depths, 1900.)):
+            self.assertTrue(abs(p1-p2) <= 1.e-2*p2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import os, sys
+sys.path.insert(1,os.path.abspath('..'))
+
+import numpy as np
+import burnman
+from burnman import misfit
+
+
+class misfits(unittest.TestCase):
+    def setUp(self):
+        self.depths = np.linspace(700.e3, 2800.e3, 20)
+        self.seis = dict(zip(['pressure', 'rho', 'v_p', 'v_s', 'v_phi'],
+                             burnman.seismic.prem_model.evaluate_all_at(self.depths)))
+        self.factors = np.array([0.98, 1.0, 1.01, 1.03])[:, np.newaxis]
+        self.calc = dict((name, self.factors*self.seis[name]) for name in misfit.observables)
+
+    def test_single_profile(self):
+        vs = self.calc['v_s']
+        for i in range(len(vs)):
+            self.assertEqual(burnman.chi_factor(vs[i], self.seis['v_s']),
+                             misfit.chi_factor(vs, self.seis['v_s'])[i])
+            self.assertEqual(burnman.l2(self.depths, vs[i], self.seis['v_s']),
+                             misfit.l2(self.depths, vs, self.seis['v_s'])[i])
+            self.assertEqual(burnman.nrmse(self.depths, vs[i], self.seis['v_s']),
+                             misfit.nrmse(vs, self.seis['v_s'])[i])
+        errors = burnman.compare_chifactor([vs[0], self.calc['rho'][0]], [self.seis['v_s'], self.seis['rho']])
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(errors[0], misfit.chi_factor(vs[0], self.seis['v_s']))
+
+    def test_batch(self):
+        result = misfit.misfits(self.calc, self.seis)
+        for name in misfit.observables:
+            self.assertEqual(result[name].shape, (4,))
+            self.assertEqual(np.argmin(result[name]), 1)
+        # the chi factor of a constant relative error
+        rel = (self.factors-1.)*self.seis['v_s']/(0.01*np.mean(self.seis['v_s']))
+        self.assertTrue(np.allclose(result['v_s'], np.mean(rel*rel, axis=1)))
+
+    def test_weights_and_uncertainties(self):
+        uncertainty = 0.02*self.seis['v_s']
+        result = misfit.misfits({'v_s': self.calc['v_s']}, self.seis, uncertainties={'v_s': uncertainty})
+        self.assertTrue(np.allclose(result['v_s'], ((self.factors[:,0]-1.)/0.02)**2))
+
+        weights = np.zeros(len(self.depths))
+        weights[:10] = 1.
+        weighted = misfit.misfits({'rho': self.calc['rho']}, self.seis, weights=weights)
+        expected = misfit.chi_factor(self.calc['rho'][:,:10], self.seis['rho'][:10],
+                                     uncertainty=0.01*np.mean(self.seis['rho']))
+        self.assertTrue(np.allclose(weighted['rho'], expected))
+
+        l2 = misfit.misfits(self.calc, self.seis, norm='l2', depths=self.depths)
+        self.assertTrue(np.allclose(l2['v_p'], misfit.l2(self.depths, self.calc['v_p'], self.seis['v_p'])))
+        self.assertRaises(ValueError, misfit.misfits, self.calc, self.seis, norm='l1')
+
+    def test_several_references(self):
+        slow = dict((name, 0.99*self.seis[name]) for name in self.seis)
+        result = misfit.misfits(self.calc, [self.seis, slow], uncertainties=[{}, {'v_s': 0.01*slow['v_s']}])
+        self.assertEqual(result['v_s'].shape, (2, 4))
+        self.assertTrue(np.array_equal(result['v_s'][0], misfit.misfits(self.calc, self.seis)['v_s']))
+        self.assertTrue(np.allclose(result['v_s'][1], ((self.factors[:,0]/0.99-1.)/0.01)**2))
+        self.assertTrue(np.array_equal(result['rho'][1], misfit.chi_factor(self.calc['rho'], slow['rho'])))
+
+    def test_reference_models(self):
+        models = burnman.seismic.evaluate_models(self.depths)
+        self.assertEqual(models.keys(), ['prem', 'slow', 'fast', 'ak135'])
+        for name in models:
+            model = burnman.seismic.reference_models[name]
+            for (key, values) in zip(['pressure', 'rho', 'v_p', 'v_s', 'v_phi'], model.evaluate_all_at(self.depths)):
+                self.assertTrue(np.array_equal(models[name][key], values))
+
+        props = dict(self.calc, K_S=np.ones((4, 20)))
+        (names, result) = misfit.compare_to_references(self.depths, props)
+        self.assertEqual(names, models.keys())
+        self.assertFalse('K_S' in result)
+        self.assertEqual(result['v_s'].shape, (4, 4))
+        self.assertEqual(result['v_s'][0,1], 0.)
+        for (idx, name) in enumerate(names):
+            self.assertTrue(np.array_equal(result['v_p'][idx], misfit.chi_factor(self.calc['v_p'], models[name]['v_p'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
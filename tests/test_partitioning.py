@@ -0,0 +1,50 @@
+import unittest
+import os, sys
+sys.path.insert(1,os.path.abspath('..'))
+
+import numpy as np
+import burnman
+from burnman import minerals
+from burnman import partitioning
+
+
+class partition(unittest.TestCase):
+    def setUp(self):
+        self.weight_percents = {'Mg':0.213, 'Fe': 0.08, 'Si':0.27, 'Ca':0., 'Al':0.}
+        self.pressures = np.linspace(30.e9, 120.e9, 5)
+        self.temperatures = np.linspace(1800., 2500., 5)
+
+    def test_arrays(self):
+        (phases, components) = burnman.calculate_phase_percents(self.weight_percents)
+        (a, b) = burnman.calculate_partition_coefficient(self.pressures, self.temperatures, components, 0.5)
+        for i in range(len(self.pressures)):
+            self.assertEqual((a[i], b[i]), burnman.calculate_partition_coefficient(self.pressures[i], self.temperatures[i],
+                                                                                   components, 0.5))
+
+    def test_compositions(self):
+        iron = np.array([0.06, 0.08, 0.1])
+        inp = dict(self.weight_percents, Fe=iron)
+        (phases, components) = burnman.calculate_phase_percents(inp)
+        (P, T, a, b, pv, fp) = partitioning.part_coef_calc(inp, 30., 120., 10.)
+        self.assertEqual(a.shape, (3, 10))
+        self.assertEqual(len(pv), 3)
+        for (idx, fe) in enumerate(iron):
+            (phases, components) = burnman.calculate_phase_percents(dict(self.weight_percents, Fe=fe))
+            self.assertEqual(pv[idx], phases['pv'])
+            self.assertTrue(np.allclose(b[idx], burnman.calculate_partition_coefficient(P, T, components, 0.5)[1], rtol=1.e-14))
+        self.assertTrue(np.all(np.diff(a[:,0]) > 0.))
+
+    def test_fe_dependent_minerals(self):
+        (phases, components) = burnman.calculate_phase_percents(self.weight_percents)
+        iron_content = lambda p,t: burnman.calculate_partition_coefficient(p,t,components,0.5)
+        mineral = minerals.SLB_2011.ferropericlase_pt_dependent(iron_content,0)
+        mineral.set_method('slb3')
+        props = burnman.evaluation.evaluate_pointwise(mineral, self.pressures, self.temperatures)
+        for i in range(len(self.pressures)):
+            mineral.set_state(self.pressures[i], self.temperatures[i])
+            self.assertAlmostEqual(props['rho'][i]/mineral.density(), 1., 6)
+            self.assertAlmostEqual(props['G'][i]/mineral.shear_modulus(), 1., 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,277 @@
+import unittest
+import os, sys
+import tempfile, shutil
+sys.path.insert(1,os.path.abspath('..'))
+
+import numpy as np
+import burnman
+from burnman import seismic, tools
+
+
+class radiustable(unittest.TestCase):
+    def test_lookup(self):
+        model = seismic.prem()
+        # include the table rows, discontinuities and points outside of the table
+        depths = np.concatenate([np.linspace(-10.e3, 6400.e3, 200), model.earth_radius-model.table_radius])
+        (pressures, density, v_p, v_s, v_phi) = model.evaluate_all_at(depths)
+        for (idx, depth) in enumerate(depths):
+            radius = model.earth_radius - depth
+            self.assertEqual(pressures[idx], tools.lookup_and_interpolate(model.table_radius, model.table_pressure, radius))
+            self.assertEqual(v_s[idx], tools.lookup_and_interpolate(model.table_radius, model.table_vs, radius))
+            self.assertEqual(v_s[idx], model.v_s(depth))
+            self.assertEqual(v_phi[idx], model.v_phi(depth))
+
+    def test_discontinuities(self):
+        model = seismic.prem()
+        discontinuities = model.discontinuities()
+        self.assertTrue(670.e3 in discontinuities and 2891.e3 in discontinuities)
+        # below and above the core mantle boundary
+        self.assertEqual(model.v_s(2891.e3), 0.)
+        self.assertAlmostEqual(model.v_s(2891.e3 - 1.), 7264.66, 2)
+        model.discontinuity_side = 'above'
+        self.assertEqual(model.v_s(2891.e3), 7264.66)
+        # away from the discontinuities nothing changes
+        depths = np.linspace(0., 6371.e3, 77)
+        above = model.evaluate_all_at(depths)
+        model.discontinuity_side = 'below'
+        for (a, b) in zip(above, model.evaluate_all_at(depths)):
+            self.assertTrue(np.array_equal(a, b))
+
+    def test_single_row_layers(self):
+        model = seismic.radiustable()
+        model.earth_radius = 3000.
+        model.table_radius = np.array([1000., 1000., 2000., 3000.])
+        model.table_vs = np.array([1., 2., 3., 4.])
+        # depths of the radii 500, 1000 (the bottom layer of one row), 1500
+        depths = np.array([2500., 2000., 1500.])
+        self.assertEqual(list(model.v_s(depths)), [1., 1., 2.5])
+        model.discontinuity_side = 'above'
+        self.assertEqual(list(model.v_s(depths)), [1., 2., 2.5])
+
+        model = seismic.radiustable()
+        model.earth_radius = 3000.
+        model.table_radius = np.array([1000., 2000., 3000., 3000.])
+        model.table_vs = np.array([1., 2., 3., 4.])
+        # depths of the radii 3000 (the top layer of one row), 3500, 2500
+        depths = np.array([0., -500., 500.])
+        self.assertEqual(list(model.v_s(depths)), [3., 4., 2.5])
+        model.discontinuity_side = 'above'
+        self.assertEqual(list(model.v_s(depths)), [4., 4., 2.5])
+
+    def test_depth(self):
+        model = seismic.prem()
+        pressures = np.concatenate([np.linspace(-1.e9, 400.e9, 200), model.table_pressure])
+        depths = model.depth(pressures)
+        for (idx, pressure) in enumerate(pressures):
+            radius = tools.lookup_and_interpolate(model.table_pressure[::-1], model.table_radius[::-1], pressure)
+            self.assertEqual(depths[idx], model.earth_radius - radius)
+            self.assertEqual(depths[idx], model.depth(pressure))
+
+        # the inverse is rebuilt when the table changes
+        model.table_pressure = model.table_pressure * 2.
+        self.assertAlmostEqual(model.depth(2.*pressures[50]), depths[50])
+
+    def test_uniform(self):
+        model = seismic.prem()
+        uniform = seismic.uniform_radiustable(model, 1.e3)
+        depths = np.linspace(700.e3, 2800.e3, 100)
+        for (a, b) in zip(uniform.evaluate_all_at(depths), model.evaluate_all_at(depths)):
+            for (i1, i2) in zip(a, b):
+                self.assertTrue(abs(i1-i2) <= 1.e-10*abs(i2))
+        self.assertEqual(uniform.v_p(-10.e3), model.v_p(0.))
+        self.assertEqual(uniform.v_p(7000.e3), model.v_p(model.earth_radius))
+
+
+class table_models(unittest.TestCase):
+    def test_columns(self):
+        table = np.array(tools.read_table("input_seismic/prem_withQ.txt"))
+        model = seismic.prem_withQ()
+        self.assertTrue(np.array_equal(model.table_radius, table[:,0]))
+        self.assertTrue(np.array_equal(model.table_pressure, table[:,1]*1.e9))
+        self.assertTrue(np.array_equal(model.table_QG, table[:,6]))
+        self.assertAlmostEqual(model.pressure(2000.e3)/seismic.prem_test().pressure(2000.e3), 1.0, 6)
+
+    def test_stitched(self):
+        model = seismic.slow()
+        table = np.array(tools.read_table("input_seismic/swave_slow.txt"))
+        self.assertTrue(np.array_equal(model.table_vs, table[:,1]))
+        self.assertTrue(np.allclose(model.earth_radius - model.table_radius, table[:,0], rtol=1.e-6))
+
+
+class tomography(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.latitudes = np.linspace(-90., 90., 7)
+        self.longitudes = np.arange(0., 360., 60.)
+        self.depths = np.linspace(700.e3, 2800.e3, 5)
+        self.dvs = 0.01*np.random.RandomState(1).standard_normal((7, 6, 5))
+        np.save(os.path.join(self.directory, "dvs.npy"), self.dvs)
+        self.model = seismic.tomography_model(self.latitudes, self.longitudes, self.depths,
+                                              os.path.join(self.directory, "dvs.npy"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_nodes(self):
+        (lat, lon, depth) = np.meshgrid(self.latitudes, self.longitudes, self.depths, indexing='ij')
+        self.model.chunk_size = 17
+        v_s = self.model.v_s_at(lat, lon + 360., depth)
+        expected = seismic.prem_model.v_s(depth) * (1. + self.dvs)
+        self.assertTrue(np.allclose(v_s, expected, rtol=1.e-12))
+        # halfway between two nodes
+        self.assertAlmostEqual(self.model.v_s_at(0., 30., 700.e3) / seismic.prem_model.v_s(700.e3),
+                               1. + 0.5*(self.dvs[3,0,0] + self.dvs[3,1,0]), 12)
+
+    def test_seam(self):
+        # halfway between the last longitude and the first one
+        expected = 1. + 0.5*(self.dvs[3,5,0] + self.dvs[3,0,0])
+        for lon in [330., -30., 690.]:
+            self.assertAlmostEqual(self.model.v_s_at(0., lon, 700.e3) / seismic.prem_model.v_s(700.e3), expected, 12)
+        v_s = self.model.v_s_at(0., np.array([300., 345., 359.999999]), 700.e3) / seismic.prem_model.v_s(700.e3)
+        self.assertAlmostEqual(v_s[0], 1. + self.dvs[3,5,0], 12)
+        self.assertAlmostEqual(v_s[1], 1. + 0.25*self.dvs[3,5,0] + 0.75*self.dvs[3,0,0], 12)
+        self.assertAlmostEqual(v_s[2], 1. + self.dvs[3,0,0], 6)
+        # a regional grid does not wrap around
+        regional = seismic.tomography_model(self.latitudes, self.longitudes[:3], self.depths, self.dvs[:, :3])
+        self.assertAlmostEqual(regional.v_s_at(0., 480., 700.e3) / seismic.prem_model.v_s(700.e3),
+                               1. + self.dvs[3,2,0], 12)
+        self.assertRaises(ValueError, regional.v_s_at, 0., 150., 700.e3)
+
+    def test_misfit(self):
+        predicted = seismic.prem_model.v_s(self.depths) * 1.01
+        expected = seismic.prem_model.v_s(self.depths) * (1. + self.dvs) - predicted
+        weight = np.cos(np.radians(self.latitudes))[:, np.newaxis, np.newaxis] * np.ones(self.dvs.shape)
+        misfit = np.sqrt(np.sum(weight*expected*expected)/np.sum(weight))
+        for chunk_size in [1, 60, 1000000]:
+            self.model.chunk_size = chunk_size
+            self.assertAlmostEqual(self.model.misfit(predicted), misfit, 8)
+            residuals = self.model.residuals(predicted, os.path.join(self.directory, "residuals.npy"))
+            self.assertTrue(np.allclose(residuals, expected, rtol=1.e-12))
+
+
+class attenuation(unittest.TestCase):
+    def test_arrays(self):
+        model = seismic.prem_withQ()
+        depths = np.linspace(700.e3, 2800.e3, 20)
+        (v_p, v_s, v_phi) = (model.v_p(depths), model.v_s(depths), model.v_phi(depths))
+        (Qs, Qphi) = (model.QG(depths), model.QK(depths))
+        corrected = burnman.apply_attenuation_correction(v_p, v_s, v_phi, Qs, Qphi)
+        for i in range(len(depths)):
+            expected = seismic.attenuation_correction(v_p[i], v_s[i], v_phi[i], Qs[i], Qphi[i])
+            for j in range(3):
+                self.assertAlmostEqual(corrected[j][i]/expected[j], 1., 12)
+        self.assertRaises(ValueError, seismic.slow().QK, depths)
+
+    def test_quality_factors(self):
+        model = seismic.prem_withQ()
+        pressures = model.pressure(np.linspace(700.e3, 2800.e3, 5))
+        (Qs, Qphi) = burnman.quality_factors(model, pressures)
+        self.assertTrue(np.array_equal(Qs, model.QG(model.depth(pressures))))
+        for Q in [(Qs, Qphi), [Qs, Qphi], np.array([Qs, Qphi])]:
+            result = burnman.quality_factors(Q, pressures)
+            self.assertTrue(np.array_equal(result[0], Qs) and np.array_equal(result[1], Qphi))
+        for Q in [300., (300.,), (300., 57823., 1.)]:
+            self.assertRaises(ValueError, burnman.quality_factors, Q, pressures)
+
+    def test_velocities_from_rock(self):
+        rock = burnman.composite( [ (burnman.minerals.SLB_2011.mg_perovskite(), 0.8),
+                                    (burnman.minerals.SLB_2011.periclase(), 0.2) ] )
+        rock.set_method('slb3')
+        model = seismic.prem_withQ()
+        depths = np.linspace(700.e3, 2800.e3, 5)
+        pressures = model.pressure(depths)
+        temperatures = burnman.geotherm.brown_shankland(pressures)
+        (rho, v_p, v_s, v_phi, K, G) = burnman.velocities_from_rock(rock, pressures, temperatures)
+        corrected = burnman.velocities_from_rock(rock, pressures, temperatures, Q=model)
+        expected = burnman.apply_attenuation_correction(v_p, v_s, v_phi, model.QG(model.depth(pressures)),
+                                                        model.QK(model.depth(pressures)))
+        for j in range(3):
+            self.assertTrue(np.allclose(corrected[j+1], expected[j], rtol=1.e-12))
+        self.assertTrue(np.all(corrected[2] < v_s))
+        self.assertTrue(np.array_equal(corrected[5], G))
+        constant = burnman.velocities_from_rock(rock, pressures, temperatures, Q=(300., 10000.))
+        self.assertTrue(np.allclose(constant[2], burnman.apply_attenuation_correction(v_p, v_s, v_phi, 300., 10000.)[1]))
+
+
+class tables(unittest.TestCase):
+    def test_cached_table(self):
+        table = tools.cached_table("input_seismic/prem_table.txt")
+        self.assertTrue(table is tools.cached_table("input_seismic/prem_table.txt"))
+        self.assertFalse(table.flags.writeable)
+        self.assertTrue(np.array_equal(table, np.array(tools.read_table("input_seismic/prem_table.txt"))))
+
+        # without a cache directory the table is parsed again
+        tools._cached_tables.clear()
+        self.assertTrue(np.array_equal(table, tools.cached_table("input_seismic/prem_table.txt")))
+
+    def test_table_cache_directory(self):
+        directory = tempfile.mkdtemp()
+        default = tools.table_cache_directory
+        try:
+            tools.table_cache_directory = os.path.join(directory, "cache")
+            filename = os.path.join(directory, "table.txt")
+            with open(filename, 'w') as f:
+                f.write("1 2\n3 4\n")
+            os.utime(filename, (1000, 1000))
+            table = tools.cached_table(filename)
+            self.assertEqual(len(os.listdir(tools.table_cache_directory)), 1)
+
+            # a new process only finds the binary copy
+            tools._cached_tables.clear()
+            with open(filename, 'w') as f:
+                f.write("5 6\n7 8\n")
+            os.utime(filename, (1000, 1000))
+            binary = tools.cached_table(filename)
+            self.assertTrue(np.array_equal(binary, table))
+            self.assertFalse(binary.flags.writeable)
+
+            # a changed file replaces the old binary copy
+            with open(filename, 'w') as f:
+                f.write("5 6\n7 8\n9 10\n")
+            self.assertTrue(np.array_equal(tools.cached_table(filename), [[5., 6.], [7., 8.], [9., 10.]]))
+            self.assertEqual(len(os.listdir(tools.table_cache_directory)), 1)
+        finally:
+            tools.table_cache_directory = default
+            tools._cached_tables.clear()
+            shutil.rmtree(directory)
+
+    def test_lookup_and_interpolate(self):
+        table = tools.cached_table("input_geotherm/brown_81.txt")
+        x_values = np.concatenate([np.linspace(-100.e3, 3000.e3, 101), table[:,0]])
+        weights = tools.interpolation_weights(table[:,0], x_values)
+        for (column, values) in [(1, tools.lookup_and_interpolate(table[:,0], table[:,1], x_values)),
+                                 (1, tools.lookup_and_interpolate(table[:,0], table[:,1], x_values, weights)),
+                                 (0, tools.lookup_and_interpolate(table[:,0], table, x_values)[:,0])]:
+            for (x, value) in zip(x_values, values):
+                self.assertEqual(value, tools.lookup_and_interpolate(table[:,0], table[:,column], x))
+        self.assertTrue(np.array_equal(tools.linear_interpol(np.array([1., 2.]), 0., 4., 1., 5.), [2., 3.]))
+
+    def test_read_table(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "table.txt")
+            with open(filename, 'w') as f:
+                f.write("# comment\nx y z\n1 2 3\n\n# another comment\n4.5 5e3 -6\n7 8 9\n")
+            table = tools.read_table(filename, header_rows=1)
+            expected = np.array([[1., 2., 3.], [4.5, 5.e3, -6.], [7., 8., 9.]])
+            self.assertTrue(np.array_equal(table, expected))
+            self.assertTrue(table.flags.c_contiguous)
+            chunks = list(tools.read_table_chunks(filename, header_rows=1, chunk_rows=2))
+            self.assertTrue(np.array_equal(np.concatenate(chunks), expected))
+            self.assertTrue(all(len(chunk) <= 2 for chunk in chunks))
+            self.assertRaises(ValueError, tools.read_table, filename)
+
+            tools.write_table_sidecar(filename, header_rows=1)
+            os.remove(filename)
+            with open(filename, 'w') as f:
+                f.write("1 2\n")
+            os.utime(filename, (0, 0))
+            table = tools.read_table(filename)
+            self.assertTrue(np.array_equal(table, expected))
+            self.assertFalse(table.flags.writeable)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 import os, sys
+import numpy as np
 sys.path.insert(1,os.path.abspath('..'))
 
 import burnman
@@ -42,6 +43,14 @@ class VRH_average(unittest.TestCase):
         v = avg.voigt_reuss_hill_function([1.0, 2.0],[0.1, 0.2])        
         self.assertAlmostEqual(0.15833333333333, v)
 
+    def test_arrays_with_nan(self):
+        V = np.array([[1.0, 1.0], [2.0, 2.0]])
+        X = np.array([[0.1, np.nan], [0.2, 0.2]])
+        with np.errstate(invalid='raise'):
+            v = avg.reuss_average_function(V, X)
+        self.assertAlmostEqual(v[0], avg.reuss_average_function([1.0, 2.0], [0.1, 0.2]))
+        self.assertTrue(np.isnan(v[1]))
+
 class VRH(unittest.TestCase):
     def test_1(self):
         rock = burnman.composite ( ( (mypericlase(), 1.0),) )
@@ -87,5 +96,26 @@ class VRH(unittest.TestCase):
         self.assertAlmostEqual(150.901, G_vrh[0]/1.e9, 2)
 
 
+class phase_properties(unittest.TestCase):
+    def test_reaverage(self):
+        pressures = np.linspace(30.e9, 120.e9, 4)
+        temperatures = np.linspace(1800., 2500., 4)
+        mins = [minerals.SLB_2011.mg_fe_perovskite(0.1), minerals.SLB_2011.ferropericlase(0.2)]
+        for m in mins:
+            m.set_method('slb3')
+        props = burnman.phase_properties(mins, pressures, temperatures)
+        schemes = [avg.voigt(), avg.reuss(), avg.voigt_reuss_hill(), avg.hashin_shtrikman_upper(), \
+                       avg.hashin_shtrikman_lower(), avg.hashin_shtrikman_average()]
+        for x in [0.0, 0.3, 1.0]:
+            rock = burnman.composite( [ (mins[0], x), (mins[1], 1.0-x) ] )
+            for scheme in schemes:
+                reference = burnman.average_moduli(burnman.calculate_moduli(rock, pressures, temperatures), scheme)
+                rho, K, G = props.average([x, 1.0-x], scheme)
+                for idx in range(len(pressures)):
+                    self.assertAlmostEqual(reference[idx].rho/rho[idx], 1.0, 10)
+                    self.assertAlmostEqual(reference[idx].K/K[idx], 1.0, 10)
+                    self.assertAlmostEqual(reference[idx].G/G[idx], 1.0, 10)
+
+
 if __name__ == '__main__':
     unittest.main()
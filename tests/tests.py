@@ -2,6 +2,11 @@ import unittest
 from test_vrh import *
 from test_spin import *
 from test_composite import *
+from test_evaluation import *
+from test_seismic import *
+from test_geotherm import *
+from test_misfit import *
+from test_partitioning import *
 
 import os, sys
 sys.path.insert(1,os.path.abspath('..'))